@@ -0,0 +1,75 @@
+# Atribuição de leads aos disparos: cada lead é ligado ao disparo mais recente do
+# mesmo convênio/produto/canal dentro de uma janela de defasagem (em dias), por meio
+# de um merge_asof ordenado sobre os agregados diários, sem produto cartesiano.
+import numpy as np
+import pandas as pd
+
+import calendario
+from perfil import medir
+
+CHAVES = ['convenio_acronimo', 'produto', 'origem']
+
+
+def _envios_diarios(df_gasto):
+    envios = pd.DataFrame({
+        'convenio_acronimo': df_gasto['Convênio'].to_numpy(),
+        'produto': df_gasto['Produto'].to_numpy(),
+        'origem': df_gasto['Canal'].to_numpy(),
+        'dia_num': df_gasto['dia_num'].to_numpy(),
+        'quantidade': df_gasto['Quantidade'].to_numpy(),
+        'gasto': df_gasto['Valor Gasto'].to_numpy(),
+    })
+    envios = envios[envios['dia_num'] != calendario.DIA_INVALIDO]
+    return envios.groupby(CHAVES + ['dia_num'], as_index=False)[['quantidade', 'gasto']].sum()
+
+
+def _leads_diarios(df_filtrado):
+    pago = (df_filtrado['etapa'] == 'PAGO').to_numpy()
+    leads = pd.DataFrame({
+        'convenio_acronimo': df_filtrado['convenio_acronimo'].to_numpy(),
+        'produto': df_filtrado['produto'].to_numpy(),
+        'origem': df_filtrado['origem'].to_numpy(),
+        'dia_num': df_filtrado['dia_num'].to_numpy(),
+        'leads': 1,
+        'comissao': np.where(pago, df_filtrado['comissao_paga'].fillna(0).to_numpy(), 0.0),
+    })
+    leads = leads[leads['dia_num'] != calendario.DIA_INVALIDO]
+    return leads.groupby(CHAVES + ['dia_num'], as_index=False)[['leads', 'comissao']].sum()
+
+
+@medir()
+def atribuir_leads(df_filtrado, df_gasto, defasagem_max=3):
+    envios = _envios_diarios(df_gasto)
+    leads = _leads_diarios(df_filtrado)
+
+    # Disparo mais recente de cada chave com até defasagem_max dias antes do lead
+    dias_envio = envios[CHAVES + ['dia_num']].assign(dia_envio=envios['dia_num']).sort_values('dia_num')
+    ligados = pd.merge_asof(
+        leads.sort_values('dia_num'),
+        dias_envio,
+        on='dia_num',
+        by=CHAVES,
+        direction='backward',
+        tolerance=int(defasagem_max)
+    )
+
+    atribuidos = (
+        ligados.dropna(subset=['dia_envio'])
+        .astype({'dia_envio': 'int64'})
+        .groupby(CHAVES + ['dia_envio'], as_index=False)[['leads', 'comissao']].sum()
+        .rename(columns={'dia_envio': 'dia_num', 'leads': 'leads_atribuidos', 'comissao': 'comissao_atribuida'})
+    )
+
+    por_envio = envios.merge(atribuidos, on=CHAVES + ['dia_num'], how='left')
+    por_envio[['leads_atribuidos', 'comissao_atribuida']] = por_envio[['leads_atribuidos', 'comissao_atribuida']].fillna(0)
+    por_envio['data'] = pd.to_datetime(por_envio['dia_num'], unit='D')
+
+    # Série diária pelo dia do disparo
+    serie = por_envio.groupby('data', as_index=False)[['quantidade', 'gasto', 'leads_atribuidos', 'comissao_atribuida']].sum()
+    serie['CPL'] = (serie['gasto'] / serie['leads_atribuidos'].replace(0, np.nan)).round(2)
+    serie['ROI (%)'] = (
+        (serie['comissao_atribuida'] - serie['gasto']) / serie['gasto'].replace(0, np.nan) * 100
+    ).round(2)
+
+    leads_sem_disparo = int(leads['leads'].sum() - atribuidos['leads_atribuidos'].sum())
+    return serie, por_envio, leads_sem_disparo
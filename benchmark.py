@@ -0,0 +1,204 @@
+# Benchmark do pipeline (ingestão, limpeza, filtros, gráficos e KPIs) em várias escalas
+import argparse
+import io
+import json
+import logging
+import platform
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+import atribuicao
+import dados_sinteticos
+import datas
+import graficos
+import limpeza
+import perfil
+import ranking_vendedores
+import simulador
+
+ESCALAS_PADRAO = [10_000, 1_000_000]
+
+# Gráficos medidos: nome -> função que recebe (df_filtrado, df_gasto); os que partem de
+# uma tabela derivada (ranking, atribuição, alocação) medem também o cálculo dela, como no painel
+GRAFICOS = {
+    'grafico_gasto_convenio_produto': lambda df, gasto: graficos.grafico_gasto_convenio_produto(df, gasto, 10),
+    'leads_por_origem': lambda df, gasto: graficos.leads_por_origem(df, gasto, 5),
+    'funil_de_etapas': lambda df, gasto: graficos.funil_de_etapas(df, gasto),
+    'cohort_dinamico': lambda df, gasto: graficos.cohort_dinamico(df, gasto),
+    'cpl_convenios_produto': lambda df, gasto: graficos.cpl_convenios_produto(df, gasto, top_n=10),
+    'roi_por_convenio_produto': lambda df, gasto: graficos.roi_por_convenio_produto(df, gasto, top_n=10),
+    'quantidade_leads_por_convenio': lambda df, gasto: graficos.quantidade_leads_por_convenio(df, gasto, top_n=10),
+    'roi_por_canal': lambda df, gasto: graficos.roi_por_canal(df, gasto),
+    'gasto_vs_comissao_por_canal': lambda df, gasto: graficos.gasto_vs_comissao_por_canal(df, gasto),
+    'perdas_por_etapa': lambda df, gasto: graficos.perdas_por_etapa(df),
+    'perdas_por_motivo': lambda df, gasto: graficos.perdas_por_motivo(df),
+    'grafico_leads_por_10k': lambda df, gasto: graficos.grafico_leads_por_10k(df, gasto, top_n=10),
+    'heatmap_horario_leads': lambda df, gasto: graficos.heatmap_horario_leads(df),
+    'grafico_atribuicao_diaria': lambda df, gasto: graficos.grafico_atribuicao_diaria(
+        atribuicao.atribuir_leads(df, gasto)[0]
+    ),
+    'grafico_alocacao_orcamento': lambda df, gasto: graficos.grafico_alocacao_orcamento(
+        simulador.simular_alocacao(simulador.estatisticas_historicas(df, gasto), 10_000.0)[0]
+    ),
+    'grafico_ranking_vendedores': lambda df, gasto: graficos.grafico_ranking_vendedores(
+        ranking_vendedores.ranking_vendedores(df, df['data'].max())
+    ),
+}
+
+
+# Colunas falsas para o exibir_kpis fora do Streamlit
+class _ColunaFalsa:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def markdown(self, *args, **kwargs):
+        pass
+
+
+# Colunas de data do export do HubSpot
+COLUNAS_DATA_HUBSPOT = ['Data de criação'] + [
+    f'Date entered "{etapa} ( Pipeline de Vendas)"' for etapa in ('LEAD', 'NEGOCIAÇÃO', 'CONTRATAÇÃO', 'PAGO')
+]
+
+
+# A leitura de datas com formato explícito precisa bater com o pd.to_datetime
+def conferir_datas(bruto, bruto_gasto):
+    divergencias = {coluna: datas.conferir(bruto[coluna]) for coluna in COLUNAS_DATA_HUBSPOT}
+    divergencias['Data'] = datas.conferir(bruto_gasto['Data'], dayfirst=True)
+    return {coluna: n for coluna, n in divergencias.items() if n}
+
+
+def _medir(resultados, nome, func, repeticoes, medir_memoria):
+    melhor = None
+    for _ in range(repeticoes):
+        perfil.iniciar_execucao(medir_memoria=medir_memoria)
+        with perfil.etapa(nome) as registro:
+            saida = func()
+        if melhor is None or registro['tempo_ms'] < melhor['tempo_ms']:
+            melhor = registro
+    resultados[nome] = {'tempo_ms': melhor['tempo_ms'], 'pico_memoria_mb': melhor['pico_memoria_mb']}
+    return saida
+
+
+def executar_escala(linhas, repeticoes=3, medir_memoria=False, seed=0):
+    dias = 90
+    envios_por_dia = max(20, min(linhas // 500, 2_000))
+    csv_hubspot = dados_sinteticos.gerar_hubspot(linhas, dias=dias, seed=seed).to_csv(index=False)
+    csv_gasto = dados_sinteticos.gerar_gasto(envios_por_dia, dias=dias, seed=seed).to_csv(index=False)
+
+    resultados = {}
+    bruto, bruto_gasto = _medir(
+        resultados, 'ingestao',
+        lambda: (pd.read_csv(io.StringIO(csv_hubspot)), pd.read_csv(io.StringIO(csv_gasto))),
+        repeticoes, medir_memoria
+    )
+    divergencias = conferir_datas(bruto, bruto_gasto)
+    if divergencias:
+        raise RuntimeError(f'Leitura de datas diverge do pd.to_datetime: {divergencias}')
+    df = _medir(resultados, 'tratar_arquivo_hubspot', lambda: limpeza.tratar_arquivo_hubspot(bruto.copy()), repeticoes, medir_memoria)
+    df_gasto = _medir(resultados, 'tratar_arquivo_pagos', lambda: limpeza.tratar_arquivo_pagos(bruto_gasto.copy()), repeticoes, medir_memoria)
+
+    filtros = {
+        'equipe': list(df['equipe'].unique()),
+        'produto': list(df['produto'].unique()),
+        'convenio_acronimo': list(df['convenio_acronimo'].unique()),
+        'origem': list(df['origem'].unique())
+    }
+    data_inicio, data_fim = df['data'].min(), df['data'].max()
+    df_filtrado, gasto_filtrado = _medir(
+        resultados, 'aplicar_filtros',
+        lambda: limpeza.aplicar_filtros(df, df_gasto, filtros, 'Lead', data_inicio, data_fim),
+        repeticoes, medir_memoria
+    )
+    _medir(
+        resultados, 'filtrar_dias_uteis',
+        lambda: limpeza.filtrar_dias_uteis(df_filtrado, data_inicio, data_fim, True),
+        repeticoes, medir_memoria
+    )
+    gastos = _medir(resultados, 'calcular_gastos', lambda: limpeza.calcular_gastos(gasto_filtrado), repeticoes, medir_memoria)
+
+    colunas = [_ColunaFalsa() for _ in range(6)]
+    _medir(
+        resultados, 'exibir_kpis',
+        lambda: graficos.exibir_kpis(df, df_filtrado, gastos, data_inicio, data_fim, True, colunas),
+        repeticoes, medir_memoria
+    )
+    for nome, func in GRAFICOS.items():
+        _medir(resultados, nome, lambda: func(df_filtrado, gasto_filtrado), repeticoes, medir_memoria)
+
+    return resultados
+
+
+# Compara com o baseline salvo e devolve as etapas que ficaram mais lentas
+def comparar(resultados, baseline, tolerancia=0.25, minimo_ms=5.0):
+    regressoes = []
+    for escala, etapas in resultados.items():
+        referencia = baseline.get(escala, {})
+        for nome, medida in etapas.items():
+            if nome not in referencia:
+                continue
+            antes, depois = referencia[nome]['tempo_ms'], medida['tempo_ms']
+            if depois > antes * (1 + tolerancia) and depois - antes > minimo_ms:
+                regressoes.append({'escala': escala, 'etapa': nome, 'antes_ms': antes, 'depois_ms': depois})
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do painel de campanhas.')
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS_PADRAO,
+                        help='Quantidade de linhas do HubSpot (ex.: 10000 1000000 10000000)')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--memoria', action='store_true', help='Mede o pico de memória com tracemalloc')
+    parser.add_argument('--saida', default='benchmark_resultados.json')
+    parser.add_argument('--baseline', default='benchmark_baseline.json')
+    parser.add_argument('--salvar-baseline', action='store_true')
+    parser.add_argument('--tolerancia', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    # Os gráficos chamam o Streamlit fora do servidor; silencia os avisos
+    for nome in list(logging.root.manager.loggerDict):
+        if nome.startswith('streamlit'):
+            logging.getLogger(nome).setLevel(logging.ERROR)
+
+    resultados = {}
+    for linhas in args.escalas:
+        # Escalas grandes rodam uma única vez
+        repeticoes = args.repeticoes if linhas <= 1_000_000 else 1
+        resultados[str(linhas)] = executar_escala(linhas, repeticoes, args.memoria)
+        for nome, medida in resultados[str(linhas)].items():
+            print(f"{linhas:>10} {nome:<32} {medida['tempo_ms']:>10.1f} ms")
+
+    registro = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'resultados': resultados
+    }
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(registro, arquivo, indent=2, ensure_ascii=False)
+
+    if args.salvar_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as arquivo:
+            json.dump(registro, arquivo, indent=2, ensure_ascii=False)
+        return 0
+
+    try:
+        with open(args.baseline, encoding='utf-8') as arquivo:
+            baseline = json.load(arquivo)['resultados']
+    except FileNotFoundError:
+        print(f'Baseline {args.baseline} não encontrado; use --salvar-baseline para criá-lo.')
+        return 0
+
+    regressoes = comparar(resultados, baseline, args.tolerancia)
+    for r in regressoes:
+        print(f"REGRESSÃO {r['escala']} {r['etapa']}: {r['antes_ms']:.1f} ms -> {r['depois_ms']:.1f} ms")
+    return 1 if regressoes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
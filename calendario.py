@@ -0,0 +1,171 @@
+# Calendário de dias úteis com feriados brasileiros, indexado por dia.
+# Cada dia vira um número inteiro (dias desde 1970-01-01), e o calendário guarda um
+# array booleano por dia: filtrar e contar dias úteis são consultas diretas no array.
+import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+ANO_INICIAL, ANO_FINAL = 2015, 2035
+
+# Feriados nacionais de data fixa (mês, dia)
+FERIADOS_FIXOS = {
+    (1, 1): 'Confraternização Universal',
+    (4, 21): 'Tiradentes',
+    (5, 1): 'Dia do Trabalho',
+    (9, 7): 'Independência do Brasil',
+    (10, 12): 'Nossa Senhora Aparecida',
+    (11, 2): 'Finados',
+    (11, 15): 'Proclamação da República',
+    (12, 25): 'Natal'
+}
+
+# Consciência Negra virou feriado nacional em 2024 (Lei 14.759/2023)
+ANO_CONSCIENCIA_NEGRA = 2024
+
+# Feriados móveis em dias de distância da Páscoa (Carnaval é ponto facultativo,
+# mas não há expediente bancário)
+FERIADOS_MOVEIS = {
+    -48: 'Carnaval (segunda)',
+    -47: 'Carnaval (terça)',
+    -2: 'Sexta-feira Santa',
+    60: 'Corpus Christi'
+}
+
+# Feriados estaduais e municipais por convênio (sigla -> lista de (mês, dia)).
+# Lista editável: inclua aqui os feriados locais que afetam cada convênio.
+FERIADOS_CONVENIO = {
+    'PREF SP': [(1, 25), (7, 9)],
+    'GOV SP': [(7, 9)],
+    'TJSP': [(7, 9)],
+    'PREF RJ': [(1, 20), (4, 23)],
+    'GOV RJ': [(4, 23)],
+    'PREF SSA': [(7, 2), (12, 8)],
+    'GOV BA': [(7, 2)],
+    'PREF REC': [(3, 6), (6, 24), (7, 16), (12, 8)],
+    'GOV PE': [(3, 6)],
+    'PREF CUR': [(9, 8), (12, 19)],
+    'GOV PR': [(12, 19)],
+    'PREF BH': [(8, 15), (12, 8)],
+    'GOV CE': [(3, 25)],
+    'GOV AM': [(9, 5)],
+    'GOV MA': [(7, 28)],
+    'GOV AL': [(9, 16)],
+    'GOV PI': [(10, 19)],
+    'GOV MS': [(10, 11)],
+    'GOV RO': [(1, 4)],
+}
+
+
+# Domingo de Páscoa (algoritmo de Meeus/Jones/Butcher)
+def pascoa(ano):
+    a = ano % 19
+    b, c = divmod(ano, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes = (h + l - 7 * m + 114) // 31
+    dia = (h + l - 7 * m + 114) % 31 + 1
+    return datetime.date(ano, mes, dia)
+
+
+def feriados_nacionais(ano):
+    feriados = {datetime.date(ano, mes, dia): nome for (mes, dia), nome in FERIADOS_FIXOS.items()}
+    if ano >= ANO_CONSCIENCIA_NEGRA:
+        feriados[datetime.date(ano, 11, 20)] = 'Consciência Negra'
+    domingo_pascoa = pascoa(ano)
+    for deslocamento, nome in FERIADOS_MOVEIS.items():
+        feriados[domingo_pascoa + datetime.timedelta(days=deslocamento)] = nome
+    return feriados
+
+
+# Número de dia usado para datas ausentes (NaT)
+DIA_INVALIDO = np.iinfo('int64').min
+
+
+# Converte datas (date, Timestamp ou texto) para número do dia; NaT vira um valor fora do calendário
+def numero_dia(datas):
+    convertidas = pd.to_datetime(pd.Series(datas), errors='coerce').to_numpy(dtype='datetime64[D]')
+    return convertidas.view('int64')
+
+
+def _numero(data):
+    return int(np.datetime64(data, 'D').astype('int64'))
+
+
+class Calendario:
+    def __init__(self, ano_inicio, ano_fim):
+        self.origem = _numero(datetime.date(ano_inicio, 1, 1))
+        dias = np.arange(self.origem, _numero(datetime.date(ano_fim, 12, 31)) + 1)
+
+        # 1970-01-01 foi quinta-feira: (n + 3) % 7 dá 0 = segunda ... 6 = domingo
+        self.util = (dias + 3) % 7 < 5
+        for ano in range(ano_inicio, ano_fim + 1):
+            for data in feriados_nacionais(ano):
+                self.util[_numero(data) - self.origem] = False
+
+        self.locais = {}
+        for convenio, datas in FERIADOS_CONVENIO.items():
+            util_local = self.util.copy()
+            for ano in range(ano_inicio, ano_fim + 1):
+                for mes, dia in datas:
+                    util_local[_numero(datetime.date(ano, mes, dia)) - self.origem] = False
+            self.locais[convenio] = util_local
+
+        # Contagem acumulada para somar dias úteis de qualquer intervalo em O(1)
+        self.acumulado = np.concatenate([[0], np.cumsum(self.util)])
+
+    def _posicoes(self, dias_num):
+        posicoes = np.asarray(dias_num, dtype='int64') - self.origem
+        validas = (posicoes >= 0) & (posicoes < len(self.util))
+        return np.where(validas, posicoes, 0), validas
+
+    # Máscara de dias úteis por linha; com convênios, aplica também os feriados locais
+    def mascara(self, dias_num, convenios=None):
+        posicoes, validas = self._posicoes(dias_num)
+        mascara = self.util[posicoes] & validas
+        if convenios is not None:
+            codigos, valores = pd.factorize(np.asarray(convenios))
+            for codigo, convenio in enumerate(valores):
+                util_local = self.locais.get(convenio)
+                if util_local is not None:
+                    linhas = codigos == codigo
+                    mascara[linhas] &= util_local[posicoes[linhas]]
+        return mascara
+
+    # Dias úteis do intervalo. Com convênios, conta os dias úteis para ao menos um deles,
+    # os mesmos dias que a máscara por linha deixa passar com os feriados locais
+    def contar(self, inicio, fim, convenios=None):
+        i0 = min(max(_numero(inicio) - self.origem, 0), len(self.util))
+        i1 = min(max(_numero(fim) - self.origem + 1, 0), len(self.util))
+        if i1 <= i0:
+            return 0
+        convenios = set(convenios) if convenios is not None else None
+        if convenios is None or any(c not in self.locais for c in convenios):
+            # Convênio sem feriado local trabalha em todo dia útil nacional
+            return int(self.acumulado[i1] - self.acumulado[i0])
+        uteis = np.zeros(i1 - i0, dtype=bool)
+        for convenio in convenios:
+            uteis |= self.locais[convenio][i0:i1]
+        return int(uteis.sum())
+
+
+@lru_cache(maxsize=4)
+def _calendario(ano_inicio, ano_fim):
+    return Calendario(ano_inicio, ano_fim)
+
+
+# Calendário que cobre o intervalo pedido (o padrão vai de ANO_INICIAL a ANO_FINAL)
+def obter_calendario(inicio=None, fim=None):
+    ano_inicio = min(ANO_INICIAL, inicio.year) if inicio is not None else ANO_INICIAL
+    ano_fim = max(ANO_FINAL, fim.year) if fim is not None else ANO_FINAL
+    return _calendario(ano_inicio, ano_fim)
+
+
+def contar_dias_uteis(inicio, fim, convenios=None):
+    return obter_calendario(inicio, fim).contar(inicio, fim, convenios)
@@ -0,0 +1,152 @@
+# Compactação das figuras plotly antes do envio ao navegador.
+# - Arrays de text que repetem x ou y saem da figura; texttemplate e hovertemplate
+#   passam a ler o eixo.
+# - Floats são arredondados para a precisão que o gráfico exibe (o formato dos
+#   templates) e enviados como o menor tipo que guarda esse valor (inteiro ou float32).
+# - customdata sai dos gráficos sem drill-down quando nenhum template o lê.
+# O template da figura é mantido: com o app rodando é o 'streamlit', que o navegador
+# usa para aplicar o tema.
+import base64
+import re
+
+import numpy as np
+import plotly.io as pio
+
+# Serializador JSON mais rápido, quando instalado
+try:
+    import orjson  # noqa: F401
+    pio.json.config.default_engine = 'orjson'
+except ImportError:
+    pass
+
+ATRIBUTOS_DADOS = ('x', 'y', 'z')
+ATRIBUTOS_TEMPLATE = ('texttemplate', 'hovertemplate')
+
+# Maior número de casas usado quando nenhum template define a precisão
+MAX_CASAS = 6
+
+# %{atributo} ou %{atributo:formato}
+_REFERENCIA = r'%\{{{}(?::([^}}]*))?\}}'
+
+
+def _array(valores):
+    if isinstance(valores, dict) and 'bdata' in valores:
+        # O plotly já guarda arrays NumPy como array tipado em base64
+        array = np.frombuffer(base64.b64decode(valores['bdata']), dtype=valores['dtype'])
+        if 'shape' in valores:
+            array = array.reshape([int(n) for n in str(valores['shape']).split(',')])
+        return array
+    if isinstance(valores, (np.ndarray, list, tuple)):
+        try:
+            array = np.asarray(valores)
+        except ValueError:
+            return None
+        return array if array.dtype.kind in 'iuf' else None
+    return None
+
+
+def _templates(trace):
+    return {nome: trace[nome] for nome in ATRIBUTOS_TEMPLATE if isinstance(trace[nome], str)}
+
+
+# Casas decimais exibidas pelos formatos d3 de um atributo (ex.: ',.2f' -> 2, '.1%' -> 3);
+# com todas=True, uma referência sem precisão (valor exibido cru) impede o arredondamento
+def _casas_exibidas(trace, atributo, todas=True):
+    casas = []
+    for texto in _templates(trace).values():
+        for formato in re.findall(_REFERENCIA.format(re.escape(atributo)), texto):
+            encontrado = re.search(r'\.(\d+)~?([a-z%]?)$', formato)
+            if encontrado is None:
+                if todas:
+                    return None
+                continue
+            casas.append(int(encontrado.group(1)) + (2 if encontrado.group(2) == '%' else 0))
+    return max(casas) if casas else None
+
+
+# Menor número de casas que representa o array (a menos do erro de soma em ponto flutuante)
+def _casas_exatas(array):
+    finitos = array[np.isfinite(array)]
+    for casas in range(MAX_CASAS + 1):
+        if np.allclose(np.round(finitos, casas), finitos, rtol=1e-12, atol=1e-9):
+            return casas
+    return None
+
+
+def _trocar_referencias(trace, antigo, novo, formato_padrao):
+    def trocar(encontrado):
+        return f"%{{{novo}:{encontrado.group(1) or formato_padrao}}}"
+    for nome, texto in _templates(trace).items():
+        trace[nome] = re.sub(_REFERENCIA.format(re.escape(antigo)), trocar, texto)
+
+
+# text igual a x ou y: os templates passam a ler o eixo, já com as casas do texto original
+def _remover_text_repetido(trace):
+    texto = _array(trace['text']) if 'text' in trace else None
+    if texto is None:
+        return
+    for eixo in ('x', 'y'):
+        valores = _array(trace[eixo]) if eixo in trace else None
+        if valores is None or valores.shape != texto.shape:
+            continue
+        if not np.array_equal(valores.astype('float64'), texto.astype('float64'), equal_nan=True):
+            continue
+        casas = _casas_exatas(texto.astype('float64'))
+        if casas is None:
+            casas = _casas_exibidas(trace, 'text', todas=False)
+        if casas is None:
+            return
+        if trace.texttemplate is None:
+            trace.texttemplate = '%{text}'
+        _trocar_referencias(trace, 'text', eixo, f'.{casas}~f')
+        trace.text = None
+        return
+
+
+# customdata só fica nas colunas lidas pelos templates
+def _podar_customdata(trace):
+    dados = trace.customdata
+    if dados is None:
+        return
+    indices = [
+        int(i or 0) for texto in _templates(trace).values() for i in re.findall(r'%\{customdata(?:\[(\d+)\])?', texto)
+    ]
+    if not indices:
+        trace.customdata = None
+    elif np.ndim(dados) == 2 and max(indices) + 1 < np.shape(dados)[1]:
+        trace.customdata = np.asarray(dados)[:, :max(indices) + 1]
+
+
+# Arredonda para as casas exibidas e usa o menor tipo que guarda o resultado
+def _reduzir(array, casas):
+    if array.dtype.kind == 'f' and casas is not None:
+        array = np.round(array, casas)
+    if array.size and np.isfinite(array).all() and np.array_equal(array, np.round(array)):
+        tipo = np.result_type(np.min_scalar_type(int(array.min())), np.min_scalar_type(int(array.max())))
+        return array.astype(tipo) if tipo.itemsize < array.dtype.itemsize else array
+    if array.dtype == np.float64 and casas is not None:
+        reduzido = array.astype('float32')
+        if np.array_equal(np.round(reduzido.astype('float64'), casas), array, equal_nan=True):
+            return reduzido
+    return array
+
+
+def compactar(fig, manter_customdata=False):
+    for trace in fig.data:
+        _remover_text_repetido(trace)
+        if not manter_customdata:
+            _podar_customdata(trace)
+        for atributo in ATRIBUTOS_DADOS:
+            array = _array(trace[atributo]) if atributo in trace else None
+            if array is None:
+                continue
+            reduzido = _reduzir(array, _casas_exibidas(trace, atributo))
+            if reduzido is not array:
+                # O plotly ignora a atribuição de um array de mesmo valor; limpa antes para trocar o tipo
+                trace[atributo] = None
+                trace[atributo] = reduzido
+    return fig
+
+
+def tamanho_kb(fig):
+    return round(len(pio.to_json(fig, validate=False)) / 1024, 2)
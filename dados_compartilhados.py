@@ -0,0 +1,113 @@
+# Armazenamento compartilhado entre sessões dos DataFrames já tratados.
+# Cada arquivo é identificado pelo hash do conteúdo: sessões que enviam o mesmo
+# arquivo reaproveitam o mesmo DataFrame, que deve ser tratado como somente leitura.
+# Estruturas derivadas de um DataFrame (índices, agregados) ficam numa tabela à parte,
+# chaveada pelo objeto, e são descartadas junto com ele.
+import hashlib
+import threading
+import weakref
+
+# Reentrante: a coleta de um DataFrame pode rodar um finalizador (que também usa a trava)
+# enquanto a mesma thread a segura
+_trava = threading.RLock()
+_entradas = {}
+_travas_carga = {}
+_derivados = {}
+_travas_derivados = {}
+
+
+def hash_conteudo(conteudo, tipo):
+    return f"{tipo}:{hashlib.sha256(conteudo).hexdigest()}"
+
+
+def _liberar(chave):
+    with _trava:
+        entrada = _entradas.get(chave)
+        if entrada is None:
+            return
+        entrada['referencias'] -= 1
+        if entrada['referencias'] <= 0:
+            del _entradas[chave]
+            _travas_carga.pop(chave, None)
+
+
+# Memória de um DataFrame ou das partes de uma tupla (ex.: DataFrame válido e quarentena)
+def _bytes(dados):
+    if isinstance(dados, tuple):
+        return sum(map(_bytes, dados))
+    if hasattr(dados, 'memory_usage'):
+        return int(dados.memory_usage(index=True, deep=True).sum())
+    return 0
+
+
+# Referência de uma sessão a um DataFrame compartilhado; libera ao ser coletada
+class ReferenciaDados:
+    def __init__(self, chave, dados):
+        self.chave = chave
+        self.dados = dados
+        weakref.finalize(self, _liberar, chave)
+
+
+def obter(conteudo, tipo, carregar):
+    chave = hash_conteudo(conteudo, tipo)
+
+    with _trava:
+        entrada = _entradas.get(chave)
+        if entrada is not None:
+            entrada['referencias'] += 1
+            return ReferenciaDados(chave, entrada['dados'])
+        trava_carga = _travas_carga.setdefault(chave, threading.Lock())
+
+    # Só uma sessão trata cada arquivo; as outras esperam e reaproveitam o resultado
+    with trava_carga:
+        with _trava:
+            entrada = _entradas.get(chave)
+            if entrada is not None:
+                entrada['referencias'] += 1
+                return ReferenciaDados(chave, entrada['dados'])
+
+        dados = carregar()
+
+        with _trava:
+            _entradas[chave] = {
+                'dados': dados,
+                'referencias': 1,
+                'bytes': _bytes(dados),
+            }
+            return ReferenciaDados(chave, dados)
+
+
+def _descartar_derivado(chave):
+    with _trava:
+        _derivados.pop(chave, None)
+        _travas_derivados.pop(chave, None)
+
+
+# Estrutura derivada de um DataFrame compartilhado, calculada uma vez por DataFrame (e
+# nome); o cálculo de cada chave roda uma única vez, sem bloquear as demais
+def derivado(df, nome, calcular):
+    chave = (id(df), nome)
+    with _trava:
+        if chave in _derivados:
+            return _derivados[chave]
+        trava_carga = _travas_derivados.setdefault(chave, threading.Lock())
+
+    with trava_carga:
+        with _trava:
+            if chave in _derivados:
+                return _derivados[chave]
+        item = calcular(df)
+        with _trava:
+            _derivados[chave] = item
+            # O id só é reaproveitado depois que o DataFrame é coletado
+            weakref.finalize(df, _descartar_derivado, chave)
+        return item
+
+
+def estatisticas():
+    with _trava:
+        return {
+            'arquivos': len(_entradas),
+            'referencias': sum(e['referencias'] for e in _entradas.values()),
+            'memoria_mb': round(sum(e['bytes'] for e in _entradas.values()) / 1024 ** 2, 2),
+        }
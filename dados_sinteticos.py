@@ -0,0 +1,155 @@
+# Gerador de exportações sintéticas do HubSpot e de gasto para testes e benchmarks
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from limpeza import MAPEAMENTO_CONVENIOS
+
+# Distribuições padrão (valor -> peso relativo)
+PESOS_ORIGEM = {'SMS': 40, 'RCS': 25, 'HYPERFLOW': 15, 'App': 8, 'URA': 4, 'Resgate': 3, 'Duplicação': 3, 'Whatsapp Grow': 2}
+PESOS_PRODUTO = {'Novo': 35, 'Cartão': 25, 'Benefício': 20, 'Benefício e Cartão': 10, 'Port': 5, 'CDX': 3, 'CP': 2}
+PESOS_EQUIPE = {'Sales': 60, 'Sales app': 15, 'Cs Cp': 8, 'Cs Port': 7, 'Cs Ativação': 5, 'Cs App': 5}
+PESOS_CANAL_GASTO = {'SMS': 50, 'RCS': 30, 'HYPERFLOW': 15, 'Whatsapp': 5}
+
+# Probabilidade de avançar para a próxima etapa e de perder quem não pagou
+TAXAS_ETAPA = {'negociacao': 0.45, 'contratacao': 0.55, 'pago': 0.7, 'perda': 0.8}
+
+MOTIVOS_PERDA = [
+    'Sem Interação', 'Telefone Inválido', 'Sem interesse', 'Sem oportunidade',
+    'Lead respondeu "NÃO" ao disparo', 'Vínculo inadequado', 'Desistência do Cliente',
+    'Não atende', 'Não receber mensagens - LGPD', 'Margem Insuficiente', 'Cliente já possui contrato'
+]
+DETALHES_PERDA = [
+    'cliente não respondeu', 'número não existe', 'sem margem disponível', 'já fez com outro banco',
+    'não tem interesse no momento', 'pediu para não receber mensagens', ''
+]
+VENDEDORES = [f'Vendedor {i:02d}' for i in range(1, 41)]
+
+FORMATO_DATA_HUBSPOT = '%Y-%m-%d %H:%M'
+FORMATO_DATA_GASTO = '%d/%m/%Y'
+
+
+def _sortear(rng, pesos, n):
+    valores = np.array(list(pesos.keys()), dtype=object)
+    p = np.array(list(pesos.values()), dtype=float)
+    return valores[rng.choice(len(valores), size=n, p=p / p.sum())]
+
+
+def _formatar(datas, formato):
+    texto = pd.Series(datas).dt.strftime(formato)
+    return texto.where(pd.Series(datas).notna(), '').to_numpy(dtype=object)
+
+
+def gerar_hubspot(linhas, data_inicio='2024-01-01', dias=90, seed=0,
+                  pesos_origem=None, pesos_produto=None, pesos_equipe=None,
+                  pesos_convenio=None, taxas_etapa=None):
+    rng = np.random.default_rng(seed)
+    taxas = {**TAXAS_ETAPA, **(taxas_etapa or {})}
+    convenios = pesos_convenio or {nome.title(): 1 for nome in MAPEAMENTO_CONVENIOS}
+
+    # Data de criação com minutos aleatórios ao longo do dia
+    inicio = np.datetime64(data_inicio, 'm')
+    minutos = rng.integers(0, dias * 24 * 60, size=linhas)
+    criado = inicio + minutos.astype('timedelta64[m]')
+
+    # Progressão pelas etapas com atraso em dias entre elas
+    def atraso(maximo):
+        return (rng.integers(0, maximo, size=linhas) * 24 * 60 + rng.integers(0, 24 * 60, size=linhas)).astype('timedelta64[m]')
+
+    negociou = rng.random(linhas) < taxas['negociacao']
+    contratou = negociou & (rng.random(linhas) < taxas['contratacao'])
+    pagou = contratou & (rng.random(linhas) < taxas['pago'])
+    perdeu = ~pagou & (rng.random(linhas) < taxas['perda'])
+
+    nat = np.datetime64('NaT', 'm')
+    data_negociacao = np.where(negociou, criado + atraso(5), nat)
+    data_contratacao = np.where(contratou, data_negociacao + atraso(7), nat)
+    data_pago = np.where(pagou, data_contratacao + atraso(15), nat)
+    ultima = np.where(contratou, data_contratacao, np.where(negociou, data_negociacao, criado))
+    data_perda = np.where(perdeu, ultima + atraso(10), nat)
+
+    etapa = np.full(linhas, 'LEAD', dtype=object)
+    etapa[negociou] = 'NEGOCIAÇÃO'
+    etapa[contratou] = 'CONTRATAÇÃO'
+    etapa[pagou] = 'PAGO'
+    etapa[perdeu] = 'PERDA'
+
+    comissao = np.round(rng.lognormal(mean=6, sigma=0.8, size=linhas), 2)
+    comissao_paga = np.where(pagou, comissao, np.nan)
+    motivo = np.where(perdeu, np.array(MOTIVOS_PERDA, dtype=object)[rng.integers(0, len(MOTIVOS_PERDA), linhas)], None)
+    detalhe = np.where(perdeu, np.array(DETALHES_PERDA, dtype=object)[rng.integers(0, len(DETALHES_PERDA), linhas)], None)
+
+    ids = np.arange(1, linhas + 1) + 10_000_000_000
+    cpfs = rng.integers(0, 10 ** 11, size=linhas)
+    telefones = rng.integers(11_900_000_000, 99_999_999_999, size=linhas)
+    vendedor = np.array(VENDEDORES, dtype=object)[rng.integers(0, len(VENDEDORES), linhas)]
+
+    return pd.DataFrame({
+        'ID do registro.': ids,
+        'Nome do negócio': np.char.add('Negócio ', ids.astype(str)).astype(object),
+        'Data de criação': _formatar(criado, FORMATO_DATA_HUBSPOT),
+        'CPF': np.char.zfill(cpfs.astype(str), 11).astype(object),
+        'Telefone': telefones,
+        'Convênio': _sortear(rng, convenios, linhas),
+        'Origem': _sortear(rng, pesos_origem or PESOS_ORIGEM, linhas),
+        'Campanha': np.char.add('CAMP-', rng.integers(1, 200, linhas).astype(str)).astype(object),
+        'Proprietário original do negócio': vendedor,
+        'Tipo de Campanha': _sortear(rng, pesos_produto or PESOS_PRODUTO, linhas),
+        'Equipe da HubSpot': _sortear(rng, pesos_equipe or PESOS_EQUIPE, linhas),
+        'Etapa do negócio': etapa,
+        'Motivo de fechamento perdido': motivo,
+        'Comissão total projetada': comissao,
+        'Valor': comissao,
+        'Proprietário do negócio': vendedor,
+        'Date entered "CONTRATAÇÃO ( Pipeline de Vendas)"': _formatar(data_contratacao, FORMATO_DATA_HUBSPOT),
+        'Date entered "LEAD ( Pipeline de Vendas)"': _formatar(criado, FORMATO_DATA_HUBSPOT),
+        'Date entered "NEGOCIAÇÃO ( Pipeline de Vendas)"': _formatar(data_negociacao, FORMATO_DATA_HUBSPOT),
+        'Date entered "PAGO ( Pipeline de Vendas)"': _formatar(data_pago, FORMATO_DATA_HUBSPOT),
+        'Date entered "PERDA ( Pipeline de Vendas)"': _formatar(data_perda, FORMATO_DATA_HUBSPOT),
+        'Detalhes do motivo de perda': detalhe,
+        'Comissão Konsigleads': comissao_paga
+    })
+
+
+def gerar_gasto(envios_por_dia=200, data_inicio='2024-01-01', dias=90, seed=0,
+                pesos_canal=None, pesos_produto=None, pesos_convenio=None,
+                quantidade_minima=500, quantidade_maxima=50_000):
+    rng = np.random.default_rng(seed + 1)
+    linhas = envios_por_dia * dias
+    convenios = pesos_convenio or {sigla: 1 for sigla in MAPEAMENTO_CONVENIOS.values()}
+    produtos = pesos_produto or {p: w for p, w in PESOS_PRODUTO.items() if p not in ('Port', 'CDX', 'CP')}
+
+    datas = np.datetime64(data_inicio, 'D') + np.repeat(np.arange(dias), envios_por_dia).astype('timedelta64[D]')
+
+    return pd.DataFrame({
+        'Data': _formatar(datas, FORMATO_DATA_GASTO),
+        'Canal': _sortear(rng, pesos_canal or PESOS_CANAL_GASTO, linhas),
+        'Convênio': _sortear(rng, convenios, linhas),
+        'Produto': _sortear(rng, produtos, linhas),
+        'Equipe': 'Sales',
+        'Quantidade': rng.integers(quantidade_minima, quantidade_maxima, size=linhas)
+    })
+
+
+def salvar_csv(pasta, linhas, envios_por_dia=200, dias=90, seed=0):
+    os.makedirs(pasta, exist_ok=True)
+    caminho_hubspot = os.path.join(pasta, 'hubspot_sintetico.csv')
+    caminho_gasto = os.path.join(pasta, 'gasto_sintetico.csv')
+    gerar_hubspot(linhas, dias=dias, seed=seed).to_csv(caminho_hubspot, index=False)
+    gerar_gasto(envios_por_dia, dias=dias, seed=seed).to_csv(caminho_gasto, index=False)
+    return caminho_hubspot, caminho_gasto
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera exportações sintéticas do HubSpot e de gasto.')
+    parser.add_argument('--linhas', type=int, default=10_000)
+    parser.add_argument('--envios-por-dia', type=int, default=200)
+    parser.add_argument('--dias', type=int, default=90)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--saida', default='dados_sinteticos')
+    args = parser.parse_args()
+
+    for caminho in salvar_csv(args.saida, args.linhas, args.envios_por_dia, args.dias, args.seed):
+        print(caminho)
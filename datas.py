@@ -0,0 +1,78 @@
+# Leitura das colunas de data dos exports.
+# O formato é detectado uma vez, da mesma forma que o pd.to_datetime faz por dentro
+# (pelo primeiro valor não vazio), e a coluna é lida com o formato explícito.
+# Cada texto distinto é lido uma única vez e o resultado é espalhado pelas linhas
+# por código (pd.factorize); muitos negócios compartilham o mesmo horário.
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# Textos que o pandas trata como data ausente ao escolher o valor de amostra
+TEXTOS_VAZIOS = {'', 'nan', 'NaN', 'NAN', 'NaT', 'nat', 'NAT'}
+
+
+def detectar_formato(unicos, dayfirst=False):
+    for valor in unicos:
+        if type(valor) is str and valor not in TEXTOS_VAZIOS:
+            return guess_datetime_format(valor, dayfirst=dayfirst)
+    return None
+
+
+# Datas distintas e o código de cada linha; None quando a coluna não é de textos
+def _ler_unicos(serie, dayfirst):
+    if serie.dtype != object and not pd.api.types.is_string_dtype(serie.dtype):
+        return None
+    codigos, unicos = pd.factorize(serie)
+    unicos = unicos.to_numpy(dtype=object)
+    if not all(type(valor) is str for valor in unicos):
+        return None
+    formato = detectar_formato(unicos, dayfirst)
+    if formato is None:
+        # Sem formato reconhecível o pandas lê valor a valor; aqui só os distintos
+        datas = pd.to_datetime(unicos, errors='coerce', dayfirst=dayfirst)
+    else:
+        datas = pd.to_datetime(unicos, format=formato, errors='coerce')
+    return codigos, pd.Series(datas)
+
+
+def _espalhar(valores, codigos, serie, vazio, dtype):
+    # Código -1 (valor ausente) cai na última posição
+    valores = np.append(valores, np.array([vazio], dtype=valores.dtype))
+    return pd.Series(valores[codigos], index=serie.index, name=serie.name, dtype=dtype)
+
+
+# Equivalente a pd.to_datetime(serie, errors='coerce', dayfirst=dayfirst)
+def converter_datas(serie, dayfirst=False):
+    lidos = _ler_unicos(serie, dayfirst)
+    if lidos is None:
+        return pd.to_datetime(serie, errors='coerce', dayfirst=dayfirst)
+    codigos, datas = lidos
+    return _espalhar(datas.to_numpy(), codigos, serie, np.datetime64('NaT'), datas.dtype)
+
+
+# Equivalente a converter_datas(serie, dayfirst).dt.date, criando um date por valor distinto
+def converter_para_date(serie, dayfirst=False):
+    return converter_datas_e_date(serie, dayfirst)[1]
+
+
+# Datas e a parte de data (date) de cada linha, lendo a coluna uma única vez
+def converter_datas_e_date(serie, dayfirst=False):
+    lidos = _ler_unicos(serie, dayfirst)
+    if lidos is None:
+        datas = pd.to_datetime(serie, errors='coerce', dayfirst=dayfirst)
+        return datas, datas.dt.date
+    codigos, datas = lidos
+    return (
+        _espalhar(datas.to_numpy(), codigos, serie, np.datetime64('NaT'), datas.dtype),
+        _espalhar(datas.dt.date.to_numpy(dtype=object), codigos, serie, pd.NaT, object),
+    )
+
+
+# Confere a leitura contra o pd.to_datetime; devolve a quantidade de linhas divergentes
+def conferir(serie, dayfirst=False):
+    esperado = pd.to_datetime(serie, errors='coerce', dayfirst=dayfirst)
+    obtido = converter_datas(serie, dayfirst)
+    if obtido.dtype != esperado.dtype:
+        return len(serie)
+    iguais = (obtido == esperado) | (obtido.isna() & esperado.isna())
+    return int((~iguais).sum())
@@ -0,0 +1,172 @@
+# Detecção de leads duplicados por CPF/telefone entre campanhas, canais e exportações.
+# CPF e telefone são normalizados e guardados apenas como hash (uint64), cada um como
+# uma chave própria. Um índice com o primeiro contato de cada chave é mantido entre
+# exportações e atualizado de forma incremental; cada lote é marcado em uma única
+# passada linear (pd.factorize). Um lead é duplicado quando o primeiro contato do seu
+# CPF ou do seu telefone é outro negócio.
+# A marcação não altera o índice: as marcas dependem só do lote e da versão do índice
+# (hash do conteúdo), que entra na chave de quem guarda o resultado.
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from perfil import medir
+
+# Caminho opcional para persistir o índice entre reinícios do servidor
+CAMINHO_INDICE = os.environ.get('CAMPANHAS_INDICE_DUPLICADOS')
+
+SEM_CHAVE = np.uint64(0)
+
+
+def _somente_digitos(valores):
+    texto = pd.Series(valores, dtype='object')
+    texto = texto.where(texto.notna(), '').astype(str)
+    # CSV com CPF numérico e valores ausentes vira float ("123.0")
+    texto = texto.str.replace(r'\.0$', '', regex=True)
+    return texto.str.replace(r'\D', '', regex=True)
+
+
+def normalizar_cpf(valores):
+    digitos = _somente_digitos(valores).str.zfill(11)
+    # CPFs com todos os dígitos iguais (000..., 111...) são inválidos
+    repetidos = digitos == digitos.str.slice(0, 1).str.repeat(11)
+    validos = (digitos.str.len() == 11) & ~repetidos
+    return digitos.where(validos)
+
+
+def normalizar_telefone(valores):
+    digitos = _somente_digitos(valores)
+    # Remove o DDI 55 e mantém DDD + número (10 ou 11 dígitos)
+    com_ddi = (digitos.str.len() >= 12) & digitos.str.startswith('55')
+    digitos = digitos.where(~com_ddi, digitos.str.slice(2)).str.lstrip('0')
+    validos = digitos.str.len().isin([10, 11])
+    return digitos.where(validos)
+
+
+def _hash(identificador):
+    chaves = pd.util.hash_array(identificador.fillna('').to_numpy(dtype=object))
+    return np.where(identificador.notna().to_numpy(), chaves, SEM_CHAVE)
+
+
+# Chaves de cada linha: colunas [hash do CPF, hash do telefone]; 0 quando inválido
+def chaves_pessoa(df):
+    cpf = 'cpf:' + normalizar_cpf(df['cpf'])
+    telefone = 'tel:' + normalizar_telefone(df['telefone'])
+    return np.column_stack([_hash(cpf), _hash(telefone)])
+
+
+class IndiceDuplicados:
+    def __init__(self, tabela=None):
+        self._trava = threading.Lock()
+        self._versao = None
+        self.tabela = tabela if tabela is not None else pd.DataFrame(
+            {'id': pd.Series(dtype='object'), 'dia_num': pd.Series(dtype='int64'), 'origem': pd.Series(dtype='object')},
+            index=pd.Index([], dtype='uint64', name='chave')
+        )
+
+    # Hash do conteúdo do índice; calculado uma vez por estado
+    @property
+    def versao(self):
+        with self._trava:
+            if self._versao is None:
+                hashes = pd.util.hash_pandas_object(self.tabela.astype({'id': str, 'origem': str}))
+                self._versao = hashlib.sha256(hashes.to_numpy().tobytes()).hexdigest()[:16]
+            return self._versao
+
+    @classmethod
+    def carregar(cls, caminho):
+        return cls(pd.read_pickle(caminho)) if caminho and os.path.exists(caminho) else cls()
+
+    def salvar(self, caminho):
+        with self._trava:
+            self.tabela.to_pickle(caminho)
+
+    # Para cada chave do lote, o contato mais antigo entre o índice e o lote
+    # (no mesmo dia, prevalece o que já estava no índice)
+    @staticmethod
+    def _vencedores(tabela, lote):
+        anteriores = tabela.reindex(lote.index).dropna(subset=['id'])
+        candidatos = pd.concat([anteriores, lote]).sort_values('dia_num', kind='stable')
+        return candidatos[~candidatos.index.duplicated(keep='first')]
+
+    # Atualiza o índice com os primeiros contatos do lote; devolve os vencedores do lote
+    def incorporar(self, lote):
+        with self._trava:
+            vencedores = self._vencedores(self.tabela, lote)
+            self.tabela = pd.concat([self.tabela.drop(vencedores.index, errors='ignore'), vencedores])
+            self._versao = None
+        return vencedores
+
+    # Marca duplicados do lote contra o estado atual do índice, sem alterá-lo;
+    # devolve também o lote de primeiros contatos, para incorporar quando for o caso
+    def marcar(self, df):
+        chaves = chaves_pessoa(df)
+        ids = df['id'].to_numpy()
+        dias = df['dia_num'].to_numpy()
+        origens = df['origem'].to_numpy()
+        linhas = np.arange(len(df))
+
+        # Ordem cronológica estável, CPF antes do telefone em cada linha: a primeira
+        # ocorrência de cada chave é o primeiro contato
+        ordem = np.argsort(dias, kind='stable')
+        posicoes = np.repeat(ordem, 2)
+        sequencia = chaves[ordem].ravel()
+        validas = sequencia != SEM_CHAVE
+        posicoes, sequencia = posicoes[validas], sequencia[validas]
+        codigos, unicas = pd.factorize(sequencia)
+        primeiras = posicoes[np.flatnonzero(~pd.Series(codigos).duplicated().to_numpy())]
+        lote = pd.DataFrame(
+            {'id': ids[primeiras], 'dia_num': dias[primeiras], 'origem': origens[primeiras]},
+            index=pd.Index(unicas, dtype='uint64', name='chave')
+        )
+
+        # Primeiro contato de cada chave da linha (CPF e telefone)
+        primeiro = self._vencedores(self.tabela, lote).reindex(chaves.ravel())
+        id_chave = primeiro['id'].to_numpy().reshape(chaves.shape)
+        dia_chave = primeiro['dia_num'].to_numpy(dtype='float64', na_value=np.nan).reshape(chaves.shape)
+        outro = pd.notna(id_chave) & (id_chave != ids[:, None])
+        duplicado = outro.any(axis=1)
+
+        # Duplicado: o contato mais antigo entre as chaves que apontam para outro negócio;
+        # senão, o da chave do CPF quando houver
+        coluna = np.where(
+            duplicado, np.argmin(np.where(outro, dia_chave, np.inf), axis=1), np.where(pd.notna(id_chave[:, 0]), 0, 1)
+        )
+        id_primeiro = id_chave[linhas, coluna]
+        origem_primeiro = primeiro['origem'].to_numpy().reshape(chaves.shape)[linhas, coluna]
+        return duplicado, id_primeiro, origem_primeiro, lote
+
+    def __len__(self):
+        return len(self.tabela)
+
+
+_indice = None
+_mtime_indice = None
+_trava_indice = threading.Lock()
+
+
+# Histórico persistido (CAMPANHAS_INDICE_DUPLICADOS), somente leitura no painel: as
+# sessões não o alteram, e ele é relido quando o job do snapshot grava um novo estado
+def indice_global():
+    global _indice, _mtime_indice
+    with _trava_indice:
+        mtime = os.path.getmtime(CAMINHO_INDICE) if CAMINHO_INDICE and os.path.exists(CAMINHO_INDICE) else None
+        if _indice is None or mtime != _mtime_indice:
+            _indice, _mtime_indice = IndiceDuplicados.carregar(CAMINHO_INDICE), mtime
+        return _indice
+
+
+# Novo DataFrame com as colunas de duplicidade e de origem do primeiro contato, marcado
+# contra o índice informado; com incorporar=True o lote também atualiza o índice
+@medir()
+def marcar_duplicados(df, indice=None, incorporar=False):
+    indice = indice_global() if indice is None else indice
+    duplicado, id_primeiro, origem_primeiro, lote = indice.marcar(df)
+    if incorporar:
+        indice.incorporar(lote)
+    return df.assign(
+        duplicado=duplicado, id_primeiro_contato=id_primeiro, origem_primeiro_contato=origem_primeiro
+    )
@@ -0,0 +1,76 @@
+# Filtro cruzado (drill-down) a partir de cliques nos gráficos.
+# Cada dimensão dos dados é fatorada uma única vez; as posições das linhas de cada
+# valor ficam guardadas, e aplicar um drill-down é só intersectar arrays de posições
+# já ordenados, sem filtrar de novo os DataFrames completos.
+import threading
+
+import numpy as np
+import pandas as pd
+
+import dados_compartilhados
+
+# Coluna de leads -> coluna equivalente no arquivo de gastos
+COLUNAS_GASTO = {
+    'convenio_acronimo': 'Convênio',
+    'produto': 'Produto',
+    'origem': 'Canal',
+}
+
+# Gráfico -> colunas lidas do customdata do ponto clicado
+COLUNAS_GRAFICO = {
+    'grafico_gasto_convenio_produto': ['convenio_acronimo', 'produto'],
+    'quantidade_leads_por_convenio': ['convenio_acronimo'],
+    'roi_por_canal': ['origem'],
+}
+
+
+# Posições das linhas de cada valor de uma coluna, calculadas sob demanda
+class IndiceLinhas:
+    def __init__(self, df):
+        self._df = df
+        self._trava = threading.Lock()
+        self._fatorados = {}
+        self._posicoes = {}
+
+    def posicoes(self, coluna, valor):
+        with self._trava:
+            if (coluna, valor) not in self._posicoes:
+                if coluna not in self._fatorados:
+                    self._fatorados[coluna] = pd.factorize(self._df[coluna])
+                codigos, valores = self._fatorados[coluna]
+                encontrados = np.flatnonzero(valores == valor)
+                self._posicoes[(coluna, valor)] = (
+                    np.flatnonzero(codigos == encontrados[0]) if len(encontrados) else np.array([], dtype='int64')
+                )
+            return self._posicoes[(coluna, valor)]
+
+
+# Um índice por DataFrame compartilhado; é descartado junto com o DataFrame
+def indice(df):
+    return dados_compartilhados.derivado(df, 'indice_linhas', IndiceLinhas)
+
+
+# Passo de drill-down a partir dos pontos selecionados no gráfico
+def passo_do_evento(nome_grafico, pontos):
+    colunas = COLUNAS_GRAFICO[nome_grafico]
+    for ponto in pontos:
+        valores = ponto.get('customdata')
+        if valores is not None:
+            return dict(zip(colunas, valores))
+    return None
+
+
+def descrever(passo):
+    return ' / '.join(f"{COLUNAS_GASTO[coluna]}: {valor}" for coluna, valor in passo.items())
+
+
+# Intersecta as posições já filtradas com as de cada passo do drill-down
+def aplicar(df, df_gasto, linhas, linhas_gasto, passos):
+    indice_leads, indice_gasto = indice(df), indice(df_gasto)
+    for passo in passos:
+        for coluna, valor in passo.items():
+            linhas = np.intersect1d(linhas, indice_leads.posicoes(coluna, valor), assume_unique=True)
+            linhas_gasto = np.intersect1d(
+                linhas_gasto, indice_gasto.posicoes(COLUNAS_GASTO[coluna], valor), assume_unique=True
+            )
+    return linhas, linhas_gasto
@@ -1,9 +1,12 @@
 # graficos.py
 import streamlit as st
+import numpy as np
 import pandas as pd
 import locale
+import calendario
 import plotly.express as px
 import plotly.graph_objects as go
+from perfil import medir
 
 # Estilização de KPIs
 def aplicar_estilo_kpi():
@@ -67,40 +70,68 @@ def mostrar_kpi(coluna, titulo, valor, delta=None, sufixo="", valor_monetario=Fa
     html += '</div>'
     coluna.markdown(html, unsafe_allow_html=True)
 
+# Calcular os valores dos KPIs (sem exibir), para reaproveitar em cache.
+# Os dias úteis vêm do mesmo calendário do filtro de linhas, com os feriados locais
+# dos convênios selecionados
+def calcular_kpis(df, df_filtrado, gastos, data_inicio, data_fim, considerar_dias_uteis, convenios=None):
+    pago_filtrado = df_filtrado['etapa'] == 'PAGO'
+    return montar_kpis(
+        df.shape[0], (df['etapa'] == 'PAGO').sum(), df_filtrado.shape[0], pago_filtrado.sum(),
+        df_filtrado.loc[pago_filtrado, 'comissao_paga'].sum(), gastos['valor_pago'].sum(),
+        data_inicio, data_fim, considerar_dias_uteis, convenios
+    )
+
+
+# KPIs a partir das contagens (das linhas ou dos agregados do snapshot)
+def montar_kpis(total_gerado, pagos_gerado, total_filtrado, pagos_filtrado, valor_gerado, valor_gasto,
+                data_inicio, data_fim, considerar_dias_uteis, convenios=None):
+    if considerar_dias_uteis:
+        dias = calendario.contar_dias_uteis(data_inicio, data_fim, convenios)
+    else:
+        dias = (data_fim - data_inicio).days + 1
+    media_leads = total_filtrado / dias if dias > 0 else 0
+
+    taxa_geral = pagos_gerado / total_gerado if total_gerado > 0 else 0
+    taxa_filtro = pagos_filtrado / total_filtrado if total_filtrado > 0 else 0
+
+    return {
+        'total_filtrado': total_filtrado,
+        'media_leads': media_leads,
+        'taxa_filtro': taxa_filtro,
+        'delta_taxa': (taxa_filtro - taxa_geral) * 100,
+        'valor_gerado': valor_gerado,
+        'valor_gasto': valor_gasto,
+        'lucro': valor_gerado - valor_gasto,
+    }
+
 # Exibir todos os KPIs
-def exibir_kpis(df, df_filtrado, gastos, data_inicio, data_fim, considerar_dias_uteis, colunas):
+@medir()
+def exibir_kpis(df, df_filtrado, gastos, data_inicio, data_fim, considerar_dias_uteis, colunas, kpis=None,
+                convenios=None):
     col1, col2, col3, col4, col5, col6 = colunas
-
-    total_gerado = df.shape[0]
-    total_filtrado = df_filtrado.shape[0]
+    if kpis is None:
+        kpis = calcular_kpis(df, df_filtrado, gastos, data_inicio, data_fim, considerar_dias_uteis, convenios)
 
     with col1:
-        mostrar_kpi(col1, "Total de Leads Gerados", total_filtrado, False)
+        mostrar_kpi(col1, "Total de Leads Gerados", kpis['total_filtrado'], False)
 
     with col2:
-        dias = pd.bdate_range(start=data_inicio, end=data_fim) if considerar_dias_uteis else pd.date_range(start=data_inicio, end=data_fim)
-        media_leads = total_filtrado / len(dias) if len(dias) > 0 else 0
-        mostrar_kpi(col2, "Média de Leads Gerados", round(media_leads, 2))
+        mostrar_kpi(col2, "Média de Leads Gerados", round(kpis['media_leads'], 2))
 
     with col3:
-        taxa_geral = df.query('etapa == "PAGO"').shape[0] / total_gerado if total_gerado > 0 else 0
-        taxa_filtro = df_filtrado.query('etapa == "PAGO"').shape[0] / total_filtrado if total_filtrado > 0 else 0
-        delta_taxa = (taxa_filtro - taxa_geral) * 100
-        mostrar_kpi(col3, "Taxa de Conversão", round(taxa_filtro * 100, 2), delta=delta_taxa, sufixo="%")
+        mostrar_kpi(col3, "Taxa de Conversão", round(kpis['taxa_filtro'] * 100, 2), delta=kpis['delta_taxa'], sufixo="%")
 
     with col4:
-        valor_gerado = df_filtrado.query('etapa == "PAGO"')['comissao_paga'].sum()
-        mostrar_kpi(col4, "Valor Total Gerado", valor_gerado, valor_monetario=True)
+        mostrar_kpi(col4, "Valor Total Gerado", kpis['valor_gerado'], valor_monetario=True)
 
     with col5:
-        valor_gasto = gastos['valor_pago'].sum()
-        mostrar_kpi(col5, "Valor Total Gasto", valor_gasto, valor_monetario=True)
+        mostrar_kpi(col5, "Valor Total Gasto", kpis['valor_gasto'], valor_monetario=True)
 
     with col6:
-        lucro = valor_gerado - valor_gasto
-        mostrar_kpi(col6, "Lucro Bruto", lucro, delta=lucro, valor_monetario=True)
+        mostrar_kpi(col6, "Lucro Bruto", kpis['lucro'], delta=kpis['lucro'], valor_monetario=True)
 
 # GRAFICO 1 - Gastos por convênio/Produto
+@medir()
 def grafico_gasto_convenio_produto(df_filtrado, df_gasto, top_n=5):
     df_pago = df_filtrado[df_filtrado['etapa'] == 'PAGO']
 
@@ -124,7 +155,7 @@ def grafico_gasto_convenio_produto(df_filtrado, df_gasto, top_n=5):
 
     df_long = pd.melt(
         convenios_completo,
-        id_vars='conv_prod',
+        id_vars=['conv_prod', 'convenio_acronimo', 'produto'],
         value_vars=['comissao_paga', 'gasto_total'],
         var_name='Tipo',
         value_name='Valor'
@@ -137,7 +168,8 @@ def grafico_gasto_convenio_produto(df_filtrado, df_gasto, top_n=5):
         color='Tipo',
         barmode='group',
         labels={'conv_prod': 'Convênio - Produto', 'Valor': 'Valor (R$)', 'Tipo': 'Tipo de Valor'},
-        text='Valor'
+        text='Valor',
+        custom_data=['convenio_acronimo', 'produto']
     )
 
     fig.update_traces(
@@ -165,6 +197,7 @@ def grafico_gasto_convenio_produto(df_filtrado, df_gasto, top_n=5):
     return fig
 
 # GRAFICO 2 - QUANTIDADE DE LEADS POR DIA (POR CADA ORIGEM)
+@medir()
 def leads_por_origem(df_filtrado, df_gasto, top_n=5):
     # Agrupar por data e origem
     gerado_convenios = df_filtrado.groupby(['data', 'origem'])['id'].size().reset_index()
@@ -233,14 +266,17 @@ def leads_por_origem(df_filtrado, df_gasto, top_n=5):
     return fig
 
 # GRAFICO 3: FUNIL
-def funil_de_etapas(df_filtrado, df_gasto):
-    etapas = {
-        'LEAD': df_filtrado['data'].notna().sum(),
-        'NEGOCIAÇÃO': df_filtrado['data_negociacao'].notna().sum(),
-        'CONTRATAÇÃO': df_filtrado['data_contratacao'].notna().sum(),
-        'PAGO': df_filtrado['data_pago'].notna().sum(),
-        'PERDA': df_filtrado['data_perda'].notna().sum()
-    }
+# etapas (etapa -> leads que chegaram a ela) pode vir pronto, dos agregados do snapshot
+@medir()
+def funil_de_etapas(df_filtrado, df_gasto, etapas=None):
+    if etapas is None:
+        etapas = {
+            'LEAD': df_filtrado['data'].notna().sum(),
+            'NEGOCIAÇÃO': df_filtrado['data_negociacao'].notna().sum(),
+            'CONTRATAÇÃO': df_filtrado['data_contratacao'].notna().sum(),
+            'PAGO': df_filtrado['data_pago'].notna().sum(),
+            'PERDA': df_filtrado['data_perda'].notna().sum()
+        }
 
     df_funil = pd.DataFrame({
         'etapa': list(etapas.keys()),
@@ -307,100 +343,144 @@ def funil_de_etapas(df_filtrado, df_gasto):
     return fig
 
 # GRAFICO 4: COHORT DINAMICO
-def preprocessar_datas(df, colunas_data):
-    for col in colunas_data:
-        df[col] = pd.to_datetime(df[col], errors='coerce')
-    return df
-
-def calcular_cohort(df, coluna_evento):
-    df['cohort'] = df['data'].dt.date
-    df['dias_ate_evento'] = (df[coluna_evento] - df['data']).dt.days
-    return df.dropna(subset=['dias_ate_evento'])
-
-def calcular_metricas_cohort(df_cohort, df_eventos):
-    cohort_counts = df_eventos.groupby(['cohort', 'dias_ate_evento']).size().reset_index(name='quantidade')
-    cohort_sizes = df_cohort.groupby('cohort').size().to_dict()
-    cohort_counts['tamanho_cohort'] = cohort_counts['cohort'].map(cohort_sizes)
-    cohort_counts['taxa'] = (cohort_counts['quantidade'] / cohort_counts['tamanho_cohort']) * 100
-    cohort_counts['cohort_str'] = (
-        cohort_counts['cohort'].astype(str) +
-        " (n=" + cohort_counts['tamanho_cohort'].astype(str) + ")"
-    )
+# Faixas de dias até o evento (rótulo -> primeiro dia da faixa); a última faixa é aberta
+FAIXAS_ATRASO = {'0': 0, '1': 1, '2–7': 2, '8–30': 8, '30+': 31}
+
+# Máximo de células do heatmap: acima disso as cohorts diárias são agrupadas por
+# semana, mês, trimestre ou ano, e o custo de renderização não cresce com o período
+LIMITE_CELULAS_COHORT = 1_500
+
+# Agrupamentos de cohort tentados em ordem: (nome, frequência do pandas, formato do rótulo)
+AGRUPAMENTOS_COHORT = [
+    ('dia', 'D', '%Y-%m-%d'),
+    ('semana', 'W', 'sem. até %Y-%m-%d'),
+    ('mês', 'M', '%m/%Y'),
+    ('trimestre', 'Q', '%Y T%q'),
+    ('ano', 'Y', '%Y'),
+]
+
+
+# Dia de entrada de cada lead e a faixa de atraso até o evento (-1 sem evento).
+# Eventos registrados antes da entrada ficam fora das faixas, mas o lead conta na cohort.
+def calcular_cohort(df, coluna_evento, faixas=FAIXAS_ATRASO):
+    dia = df['dia_num'].to_numpy() if 'dia_num' in df else calendario.numero_dia(df['data'])
+    dia_evento = calendario.numero_dia(df[coluna_evento])
+    valido = dia != calendario.DIA_INVALIDO
+    com_evento = valido & (dia_evento != calendario.DIA_INVALIDO)
+
+    atraso = np.full(len(dia), -1, dtype='int64')
+    atraso[com_evento] = dia_evento[com_evento] - dia[com_evento]
+    faixa = np.searchsorted(np.array(list(faixas.values())), atraso, 'right') - 1
+    return dia[valido], faixa[valido]
+
+
+# Tabela esparsa (só células com evento) de cohort x faixa, com as cohorts agrupadas
+# até que a matriz caiba no limite de células. Com pesos, cada posição vale essa
+# quantidade de leads (tabelas já agregadas por dia e faixa)
+def calcular_metricas_cohort(dias, faixa, faixas=FAIXAS_ATRASO, limite_celulas=LIMITE_CELULAS_COHORT, pesos=None):
+    dias_unicos, codigo_dia = np.unique(dias, return_inverse=True)
+    datas = pd.DatetimeIndex(dias_unicos.astype('datetime64[D]'))
+    for agrupamento, frequencia, formato in AGRUPAMENTOS_COHORT:
+        codigo_periodo, periodos = pd.factorize(datas.to_period(frequencia), sort=True)
+        if len(periodos) * len(faixas) <= limite_celulas:
+            break
+
+    cohort = codigo_periodo[codigo_dia]
+    tamanhos = np.bincount(cohort, weights=pesos, minlength=len(periodos)).astype('int64')
+    com_evento = faixa >= 0
+    contagem = np.bincount(
+        cohort[com_evento] * len(faixas) + faixa[com_evento],
+        weights=None if pesos is None else pesos[com_evento], minlength=len(periodos) * len(faixas)
+    ).astype('int64')
+    celulas = np.flatnonzero(contagem)
+    linha, coluna = np.divmod(celulas, len(faixas))
+
+    rotulos = [f'{nome} (n={n})' for nome, n in zip(periodos.strftime(formato), tamanhos)]
+    cohort_counts = pd.DataFrame({
+        'cohort_str': pd.Categorical.from_codes(linha, categories=rotulos),
+        'faixa': pd.Categorical.from_codes(coluna, categories=list(faixas)),
+        'quantidade': contagem[celulas],
+        'tamanho_cohort': tamanhos[linha],
+    })
+    cohort_counts['taxa'] = cohort_counts['quantidade'] / cohort_counts['tamanho_cohort'] * 100
+    cohort_counts.attrs['agrupamento'] = agrupamento
     return cohort_counts
 
-def gerar_heatmap(cohort_counts, evento_escolhido):
-    heatmap_data = cohort_counts.pivot(
-        index='cohort_str',
-        columns='dias_ate_evento',
-        values='taxa'
-    ).fillna(0)
 
-    heatmap_data = heatmap_data.sort_index(ascending=False)
-    heatmap_data = heatmap_data[sorted(heatmap_data.columns)]
-
-    fig = px.imshow(
-        heatmap_data,
-        labels=dict(
-            x=f"Dias até {evento_escolhido.lower()}",
-            y="Data de entrada (cohort)",
-            color="Conversão (%)"
-        ),
-        color_continuous_scale="Cividis",
-        aspect="auto",
-        text_auto=".1f"
-    )
+def gerar_heatmap(cohort_counts, evento_escolhido):
+    cohorts = cohort_counts['cohort_str'].cat.categories
+    faixas = cohort_counts['faixa'].cat.categories
+
+    # Células sem evento ficam vazias (NaN), sem texto; cohorts mais recentes no topo
+    matriz = np.full((len(cohorts), len(faixas)), np.nan)
+    matriz[cohort_counts['cohort_str'].cat.codes, cohort_counts['faixa'].cat.codes] = cohort_counts['taxa']
+    matriz = matriz[::-1]
+
+    fig = go.Figure(go.Heatmap(
+        z=matriz,
+        x=list(faixas),
+        y=list(cohorts[::-1]),
+        colorscale="Cividis",
+        texttemplate="%{z:.1f}",
+        hovertemplate="Cohort: %{y}<br>Dias: %{x}<br>Conversão: %{z:.1f}%<extra></extra>",
+        colorbar=dict(
+            title=dict(
+                text="Conversão (%)",
+                font=dict(size=14)
+            ),
+            tickfont=dict(size=12),
+            ticksuffix="%"
+        )
+    ))
 
+    agrupamento = cohort_counts.attrs.get('agrupamento', 'dia')
     fig.update_layout(
-        title=f"Cohort por {evento_escolhido}",
+        title=f"Cohort por {evento_escolhido} (entradas por {agrupamento})",
         title_font_size=22,
         height=600,
         font=dict(size=22),
         xaxis=dict(
             title=f"Dias até {evento_escolhido.lower()}",
             title_font=dict(size=16),
-            tickfont=dict(size=12)
+            tickfont=dict(size=12),
+            type='category'
         ),
         yaxis=dict(
             title="Data de entrada (cohort)",
             title_font=dict(size=16),
-            tickfont=dict(size=12)
-        ),
-        coloraxis_colorbar=dict(
-            title=dict(
-                text="Conversão (%)",
-                font=dict(size=14)
-            ),
             tickfont=dict(size=12),
-            ticksuffix="%"
+            type='category'
         )
     )
 
 
     return fig
 
-def cohort_dinamico(df_filtrado, df_gasto=None):
-    df_cohort = df_filtrado.copy()
-    colunas_data = ['data', 'data_negociacao', 'data_contratacao', 'data_pago', 'data_perda']
-    df_cohort = preprocessar_datas(df_cohort, colunas_data)
-
-    opcoes_evento = {
-        "Pagamento": "data_pago",
-        "Perda": "data_perda",
-        "Negociação": "data_negociacao",
-        "Contratação": "data_contratacao"
-    }
-
-    evento_escolhido = st.selectbox("Selecione o evento para análise de cohort:", list(opcoes_evento.keys()))
-    coluna_evento = opcoes_evento[evento_escolhido]
-
-    df_eventos = calcular_cohort(df_cohort, coluna_evento)
-    cohort_counts = calcular_metricas_cohort(df_cohort, df_eventos)
+# Eventos da cohort (o evento é escolhido no painel) -> coluna de data
+EVENTOS_COHORT = {
+    "Pagamento": "data_pago",
+    "Perda": "data_perda",
+    "Negociação": "data_negociacao",
+    "Contratação": "data_contratacao"
+}
+
+# cohort_evento (evento -> dias, faixas e quantidades) substitui o cálculo sobre as linhas
+@medir()
+def cohort_dinamico(df_filtrado, df_gasto=None, cohort_evento=None, evento_escolhido="Pagamento"):
+    coluna_evento = EVENTOS_COHORT[evento_escolhido]
+
+    if cohort_evento is None:
+        dias, faixa = calcular_cohort(df_filtrado, coluna_evento)
+        cohort_counts = calcular_metricas_cohort(dias, faixa)
+    else:
+        dias, faixa, quantidade = cohort_evento(evento_escolhido)
+        cohort_counts = calcular_metricas_cohort(dias, faixa, pesos=quantidade)
     fig = gerar_heatmap(cohort_counts, evento_escolhido)
 
     return fig
 
-
 # GRAFICO 5: CPL
+@medir()
 def cpl_convenios_produto(df_filtrado, df_gasto=None, top_n=5, maiores=True):
     gasto_convenios = df_gasto.groupby(['Convênio', 'Produto'])['Valor Gasto'].sum().reset_index(name='gasto_total')
     clientes_convenio = df_filtrado.groupby(['convenio_acronimo', 'produto']).size().reset_index(name='clientes')
@@ -455,6 +535,7 @@ def cpl_convenios_produto(df_filtrado, df_gasto=None, top_n=5, maiores=True):
 
     
 # GRAFICO 6: ROI DOS CONVENIOS
+@medir()
 def roi_por_convenio_produto(df_filtrado, df_gasto, top_n=5, melhores=True):
     gasto_convenios = df_gasto.groupby(['Convênio', 'Produto'])['Valor Gasto'].sum().reset_index(name='gasto_total')
     comissao_convenios = df_filtrado.loc[df_filtrado['etapa'] == 'PAGO'].groupby(['convenio_acronimo', 'produto'])['comissao_paga'].sum().reset_index(name='comissao_paga')
@@ -510,6 +591,7 @@ def roi_por_convenio_produto(df_filtrado, df_gasto, top_n=5, melhores=True):
 
 
 # Grafico 7: Quantidade de leads gerados por convênio
+@medir()
 def quantidade_leads_por_convenio(df_filtrado, df_gasto, top_n=5, ordem="maiores"):
 
     mapa_cores = {
@@ -544,7 +626,8 @@ def quantidade_leads_por_convenio(df_filtrado, df_gasto, top_n=5, ordem="maiores
         y='convenio_acronimo',
         color='produto',
         title='Leads Gerados por Convênio',
-        color_discrete_map=mapa_cores
+        color_discrete_map=mapa_cores,
+        custom_data=['convenio_acronimo']
     )
 
     graf1.update_layout(
@@ -564,6 +647,7 @@ def quantidade_leads_por_convenio(df_filtrado, df_gasto, top_n=5, ordem="maiores
 
 
 # Grafico 8: ROI por Canal
+@medir()
 def roi_por_canal(df_filtrado, df_gasto):
     df_pago = df_filtrado[df_filtrado['etapa'] == 'PAGO']
     
@@ -595,7 +679,8 @@ def roi_por_canal(df_filtrado, df_gasto):
         text='ROI (%)',
         color='ROI (%)',
         color_continuous_scale='Viridis',
-        labels={'ROI (%)': 'ROI (%)', 'origem': 'Canal'}
+        labels={'ROI (%)': 'ROI (%)', 'origem': 'Canal'},
+        custom_data=['origem']
     )
 
     fig.update_traces(texttemplate='%{text:.2f}%', textposition='outside', textfont_size=18)
@@ -612,6 +697,7 @@ def roi_por_canal(df_filtrado, df_gasto):
     return fig
 
 
+@medir()
 def gasto_vs_comissao_por_canal(df_filtrado, df_gasto):
     df_pago = df_filtrado[df_filtrado['etapa'] == 'PAGO']
 
@@ -655,23 +741,27 @@ def gasto_vs_comissao_por_canal(df_filtrado, df_gasto):
     return fig
 
 # Vazamento do funil
-def perdas_por_etapa(df_filtrado):
-    df_perdidos = df_filtrado[df_filtrado['data_perda'].notna()].copy()
-
-    def classificar_etapa_perda(row):
-        if pd.isna(row['data_negociacao']):
-            return 'LEAD'
-        elif pd.isna(row['data_contratacao']):
-            return 'NEGOCIAÇÃO'
-        elif pd.isna(row['data_pago']):
-            return 'CONTRATAÇÃO'
-        else:
-            return 'PAGO'
-
-    df_perdidos['etapa_origem'] = df_perdidos.apply(classificar_etapa_perda, axis=1)
+# Linhas perdidas e a última etapa alcançada antes da perda, classificada de forma vetorizada
+def etapa_origem_perdas(df_filtrado):
+    perdidos = df_filtrado['data_perda'].notna().to_numpy()
+    etapa_origem = np.select(
+        [
+            df_filtrado['data_negociacao'].isna().to_numpy()[perdidos],
+            df_filtrado['data_contratacao'].isna().to_numpy()[perdidos],
+            df_filtrado['data_pago'].isna().to_numpy()[perdidos],
+        ],
+        ['LEAD', 'NEGOCIAÇÃO', 'CONTRATAÇÃO'],
+        default='PAGO'
+    )
+    return perdidos, etapa_origem
 
-    perdas = df_perdidos['etapa_origem'].value_counts().reset_index()
-    perdas.columns = ['etapa_origem', 'quantidade']
+# perdas (etapa_origem, quantidade) pode vir pronto, dos agregados do snapshot
+@medir()
+def perdas_por_etapa(df_filtrado, perdas=None):
+    if perdas is None:
+        perdidos, etapa_origem = etapa_origem_perdas(df_filtrado)
+        perdas = pd.Series(etapa_origem, name='etapa_origem').value_counts().reset_index()
+        perdas.columns = ['etapa_origem', 'quantidade']
 
     # Gráfico
     fig = px.bar(
@@ -697,60 +787,70 @@ def perdas_por_etapa(df_filtrado):
 
     return fig
 
-def grafico_leads_por_10k(df_filtrado, df_gasto, top_n=10, maiores=True):
-    # Agrupamentos
-    grouped_gastos = df_gasto.groupby(['Convênio', 'Produto', 'Canal'])['Quantidade'].sum().reset_index(name='quantidade_disparada')
-    grouped_hubspot = df_filtrado.groupby(['convenio_acronimo', 'produto', 'origem']).agg({
-            'id': 'count',
-            'comissao_paga': 'sum'
-        }).reset_index().rename(columns={
-            'id': 'quantidade_gerada',
-            'comissao_paga': 'comissao_total'
-        })
+# Perdas por grupo de motivo x etapa de origem x canal
+def tabela_perdas_por_motivo(df_filtrado):
+    perdidos, etapa_origem = etapa_origem_perdas(df_filtrado)
+    perdas = pd.DataFrame({
+        'motivo': df_filtrado['motivo_perda_grupo'].to_numpy()[perdidos],
+        'etapa_origem': etapa_origem,
+        'origem': df_filtrado['origem'].to_numpy()[perdidos],
+    })
+    return perdas.groupby(['motivo', 'etapa_origem', 'origem'], observed=True, dropna=False).size().reset_index(name='quantidade')
 
-    # Merge
-    merged = grouped_gastos.merge(
-        grouped_hubspot,
-        left_on=['Convênio', 'Produto', 'Canal'],
-        right_on=['convenio_acronimo', 'produto', 'origem'],
-        how='inner'
-    )
-
-    # Conversão
-    merged['conversao'] = ((merged['quantidade_gerada'] / merged['quantidade_disparada']) * 100).round(2)
-
-    # Agregado final (conversão)
-    merged_final = merged.groupby(['Convênio', 'Produto', 'Canal']).agg({
-        'conversao': ['median', 'mean'],
-        'quantidade_gerada': 'sum'
-    }).reset_index()
-    merged_final.columns = ['Convênio', 'Produto', 'Canal', 'median', 'mean', 'quantidade_gerada']
-    merged_final['leads_por_10k'] = (merged_final['median'] / 100) * 10_000
-    merged_final['conv_prod'] = merged_final['Convênio'] + ' - ' + merged_final['Produto']
-    
-    # Adicionar a quantidade_disparada novamente ao merged_final
-    merged_final['quantidade_disparada'] = merged['quantidade_disparada'].groupby([merged['Convênio'], merged['Produto'], merged['Canal']]).transform('sum')
-
-    # Agregado de comissão
-    comissao_agg = df_filtrado.groupby(['convenio_acronimo', 'produto', 'origem'])['comissao_paga'].sum().reset_index()
-    comissao_agg.rename(columns={
-        'convenio_acronimo': 'Convênio',
-        'produto': 'Produto',
-        'origem': 'Canal',
-        'comissao_paga': 'comissao_total'
-    }, inplace=True)
+@medir()
+def perdas_por_motivo(df_filtrado, max_canais=4, perdas=None):
+    perdas = tabela_perdas_por_motivo(df_filtrado) if perdas is None else perdas.copy()
 
-    # Merge com comissão
-    merged_final = merged_final.merge(
-        comissao_agg,
-        on=['Convênio', 'Produto', 'Canal'],
-        how='left'
+    # Canais com mais perdas em painéis próprios; os demais juntos
+    principais = perdas.groupby('origem')['quantidade'].sum().nlargest(max_canais).index
+    perdas['canal'] = perdas['origem'].where(perdas['origem'].isin(principais), 'Outros canais')
+    perdas = perdas.groupby(['motivo', 'etapa_origem', 'canal'], observed=True, as_index=False)['quantidade'].sum()
+
+    fig = px.bar(
+        perdas,
+        x='quantidade',
+        y='motivo',
+        color='etapa_origem',
+        facet_col='canal',
+        orientation='h',
+        labels={'quantidade': 'Leads Perdidos', 'motivo': 'Motivo', 'etapa_origem': 'Etapa em que saíram', 'canal': 'Canal'},
+        category_orders={'etapa_origem': ['LEAD', 'NEGOCIAÇÃO', 'CONTRATAÇÃO', 'PAGO']},
+        color_discrete_sequence=px.colors.sequential.Reds[2:]
+    )
+
+    fig.for_each_annotation(lambda a: a.update(text=a.text.split('=')[-1]))
+    fig.update_layout(
+        title='Perdas por Motivo, Etapa e Canal',
+        height=550,
+        yaxis_title='',
+        font=dict(size=14),
+        barmode='stack'
     )
 
-    # Preencher nulos com 0 caso não haja comissão registrada
-    merged_final['comissao_total'] = merged_final['comissao_total'].round(2)
-    merged_final['leads_por_10k'] = merged_final['leads_por_10k'].round(2)
-    merged_final['comissao_total'] = merged_final['comissao_total'].fillna(0)
+    return fig
+
+@medir()
+def grafico_leads_por_10k(df_filtrado, df_gasto, top_n=10, maiores=True):
+    # Disparos e leads agregados no mesmo índice (Convênio, Produto, Canal); o join pelo
+    # índice mantém cada agregado alinhado à sua chave
+    disparos = df_gasto.groupby(['Convênio', 'Produto', 'Canal'])['Quantidade'].sum().rename('quantidade_disparada')
+    leads = df_filtrado.groupby(['convenio_acronimo', 'produto', 'origem']).agg(
+        quantidade_gerada=('id', 'count'),
+        comissao_total=('comissao_paga', 'sum')
+    ).rename_axis(['Convênio', 'Produto', 'Canal'])
+    merged_final = disparos.to_frame().join(leads, how='inner')
+
+    # Conversão: cada chave tem uma única linha, então mediana e média são a própria conversão
+    conversao = ((merged_final['quantidade_gerada'] / merged_final['quantidade_disparada']) * 100).round(2)
+    merged_final = merged_final.reset_index().assign(median=conversao.to_numpy(), mean=conversao.to_numpy())
+    merged_final['leads_por_10k'] = ((merged_final['median'] / 100) * 10_000).round(2)
+    merged_final['conv_prod'] = merged_final['Convênio'] + ' - ' + merged_final['Produto']
+    merged_final['comissao_total'] = merged_final['comissao_total'].round(2).fillna(0)
+    # Mesma ordem de colunas da tabela exibida e baixada no painel
+    merged_final = merged_final.reindex(columns=[
+        'Convênio', 'Produto', 'Canal', 'median', 'mean', 'quantidade_gerada', 'leads_por_10k',
+        'conv_prod', 'quantidade_disparada', 'comissao_total'
+    ])
 
     # Calcular o gasto (RCS ou SMS) baseado no Canal
     custo_por_canal = {'RCS': 0.105, 'SMS': 0.047}
@@ -788,3 +888,153 @@ def grafico_leads_por_10k(df_filtrado, df_gasto, top_n=10, maiores=True):
     )
 
     return fig, merged_final
+
+
+# Atribuição diária: CPL e ROI dos leads atribuídos a cada dia de disparo
+@medir()
+def grafico_atribuicao_diaria(serie):
+    fig = go.Figure()
+
+    fig.add_trace(go.Bar(
+        x=serie['data'],
+        y=serie['CPL'],
+        name='CPL atribuído (R$)',
+        marker_color='#33658A'
+    ))
+
+    fig.add_trace(go.Scatter(
+        x=serie['data'],
+        y=serie['ROI (%)'],
+        name='ROI atribuído (%)',
+        mode='lines+markers',
+        line=dict(color='#F6AE2D', width=3),
+        yaxis='y2'
+    ))
+
+    fig.update_layout(
+        title='CPL e ROI diários atribuídos aos disparos',
+        height=600,
+        font=dict(size=14),
+        xaxis=dict(title='Data do disparo'),
+        yaxis=dict(title='CPL (R$)', tickprefix='R$ '),
+        yaxis2=dict(title='ROI (%)', overlaying='y', side='right', ticksuffix='%'),
+        legend=dict(orientation='h', y=1.1)
+    )
+
+    return fig
+
+
+# Simulador: orçamento sugerido por convênio/produto/canal
+@medir()
+def grafico_alocacao_orcamento(alocacao, top_n=15):
+    dados = alocacao.head(top_n).copy()
+    dados['segmento'] = dados['convenio_acronimo'] + ' - ' + dados['produto'] + ' (' + dados['origem'] + ')'
+
+    fig = px.bar(
+        dados,
+        x='orcamento',
+        y='segmento',
+        orientation='h',
+        text='orcamento',
+        color='origem',
+        labels={'orcamento': 'Orçamento sugerido (R$)', 'segmento': 'Convênio - Produto (Canal)', 'origem': 'Canal'}
+    )
+
+    fig.update_traces(texttemplate='R$ %{text:,.2f}', textposition='outside')
+
+    fig.update_layout(
+        title='Alocação sugerida do orçamento',
+        height=600,
+        font=dict(size=14),
+        xaxis_title='Orçamento (R$)',
+        yaxis_title='',
+        yaxis=dict(categoryorder='total ascending')
+    )
+
+    return fig
+
+
+@medir()
+def grafico_ranking_vendedores(ranking, janela=30, top_n=15):
+    dados = ranking.nlargest(top_n, f'comissao_{janela}d')
+
+    fig = px.bar(
+        dados,
+        x=f'comissao_{janela}d',
+        y='vendedor',
+        orientation='h',
+        text=f'comissao_{janela}d',
+        color=f'conversao_{janela}d',
+        color_continuous_scale='Viridis',
+        hover_data=[f'leads_{janela}d', f'pagos_{janela}d', f'mediana_dias_pago_{janela}d'],
+        labels={
+            f'comissao_{janela}d': 'Comissão paga (R$)',
+            f'conversao_{janela}d': 'Conversão (%)',
+            f'leads_{janela}d': 'Leads',
+            f'pagos_{janela}d': 'Pagos',
+            f'mediana_dias_pago_{janela}d': 'Mediana de dias até o pago',
+            'vendedor': 'Vendedor'
+        }
+    )
+
+    fig.update_traces(texttemplate='R$ %{text:,.2f}', textposition='outside')
+
+    fig.update_layout(
+        title=f'Ranking de vendedores - últimos {janela} dias',
+        height=600,
+        font=dict(size=14),
+        xaxis_title='Comissão paga (R$)',
+        yaxis_title='',
+        yaxis=dict(categoryorder='total ascending')
+    )
+
+    return fig
+
+
+# Heatmap de leads por dia da semana x hora de criação
+DIAS_SEMANA = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+
+
+# Contagem (origens x 7 dias x 24 horas) por binning vetorizado do minuto do dia
+def contagem_por_horario(df_filtrado, origens=None):
+    minutos = df_filtrado['minuto_dia'].to_numpy()
+    dias = df_filtrado['dia_num'].to_numpy()
+    validos = (minutos >= 0) & (dias != calendario.DIA_INVALIDO)
+
+    # dia_num 0 (1970-01-01) foi quinta-feira: (n + 3) % 7 dá 0 = segunda
+    celulas = ((dias[validos] + 3) % 7) * 24 + minutos[validos].astype('int64') // 60
+    if not origens:
+        return np.bincount(celulas, minlength=7 * 24).reshape(1, 7, 24)
+
+    codigos = pd.Categorical(df_filtrado['origem'].to_numpy()[validos], categories=origens).codes.astype('int64')
+    dentro = codigos >= 0
+    contagem = np.bincount(codigos[dentro] * 7 * 24 + celulas[dentro], minlength=len(origens) * 7 * 24)
+    return contagem.reshape(len(origens), 7, 24)
+
+
+@medir()
+def heatmap_horario_leads(df_filtrado, origens=None):
+    contagem = contagem_por_horario(df_filtrado, origens)
+
+    fig = px.imshow(
+        contagem if origens else contagem[0],
+        x=[f'{h:02d}h' for h in range(24)],
+        y=DIAS_SEMANA,
+        facet_col=0 if origens else None,
+        facet_col_wrap=2 if origens else None,
+        labels=dict(x='Hora de criação', y='Dia da semana', color='Leads'),
+        color_continuous_scale='Viridis',
+        aspect='auto'
+    )
+
+    if origens:
+        # Títulos das facetas com o nome da origem em vez do índice
+        fig.for_each_annotation(lambda a: a.update(text=origens[int(a.text.split('=')[-1])]))
+
+    fig.update_layout(
+        title='Leads por dia da semana e hora de criação',
+        height=450 * ((len(origens) + 1) // 2) if origens else 500,
+        font=dict(size=14)
+    )
+
+    return fig
@@ -1,33 +1,80 @@
-import pandas as pd
-
+import numpy as np
+import calendario
+import datas
+import motivos_perda
+from perfil import medir
+
+# Acrônimos dos convênios (nome em minúsculas -> sigla)
+MAPEAMENTO_CONVENIOS = {
+    'prefeitura de recife': 'PREF REC',
+    'prefeitura de curitiba': 'PREF CUR',
+    'prefeitura de maringá': 'PREF MAR',
+    'prefeitura de goiânia': 'PREF GOI',
+    'prefeitura de belo horizonte': 'PREF BH',
+    'governo de rondônia': 'GOV RO',
+    'governo do paraná': 'GOV PR',
+    'prefeitura de são paulo': 'PREF SP',
+    'governo de são paulo': 'GOV SP',
+    'prefeitura do rio de janeiro': 'PREF RJ',
+    'governo do rio de janeiro': 'GOV RJ',
+    'prefeitura de salvador': 'PREF SSA',
+    'governo da bahia': 'GOV BA',
+    'governo de alagoas': 'GOV AL',
+    'governo do amazonas': 'GOV AM',
+    'governo do maranhão': 'GOV MA',
+    'governo de goiás': 'GOV GO',
+    'governo do ceará': 'GOV CE',
+    'governo de pernambuco': 'GOV PE',
+    'governo de mato grosso do sul': 'GOV MS',
+    'governo de mato grosso': 'GOV MT',
+    'governo do piauí': 'GOV PI',
+    'prefeitura de joão pessoa': 'PREF JP',
+    'governo de minas gerais': 'GOV MG',
+    'governo de santa catarina': 'GOV SC',
+    'inss': 'INSS',
+    'siape': 'SIAPE',
+    'tribunal de justiça de são paulo (tjsp)': 'TJSP',
+    'governo do espírito santo': 'GOV ES',
+    'marinha': 'Marinha',
+    'iniciativa privada': 'CLT'
+}
+
+
+# Colunas do export do HubSpot -> nomes usados no painel
+COLUNAS_HUBSPOT = {
+    'ID do registro.': 'id',
+    'Nome do negócio': 'nome',
+    'Data de criação': 'data_criado',
+    'CPF': 'cpf',
+    'Telefone': 'telefone',
+    'Convênio': 'convenio',
+    'Origem': 'origem',
+    'Campanha': 'tag_campanha',
+    'Proprietário original do negócio': 'vendedor',
+    'Tipo de Campanha': 'produto',
+    'Equipe da HubSpot': 'equipe',
+    'Etapa do negócio': 'etapa',
+    'Motivo de fechamento perdido': 'motivo_fechamento',
+    'Comissão total projetada': 'comissao_projetada',
+    'Valor': 'comissao_gerada',
+    'Proprietário do negócio': 'vendedor2',
+    'Date entered "CONTRATAÇÃO ( Pipeline de Vendas)"': 'data_contratacao',
+    'Date entered "LEAD ( Pipeline de Vendas)"': 'data_lead',
+    'Date entered "NEGOCIAÇÃO ( Pipeline de Vendas)"': 'data_negociacao',
+    'Date entered "PAGO ( Pipeline de Vendas)"': 'data_pago',
+    'Date entered "PERDA ( Pipeline de Vendas)"': 'data_perda',
+    'Detalhes do motivo de perda': 'detalhe_perda',
+    'Comissão Konsigleads': 'comissao_paga'
+}
+
+# Datas de entrada nas etapas do funil lidas na limpeza
+COLUNAS_DATA_ETAPA = ['data_lead', 'data_negociacao', 'data_contratacao', 'data_pago']
+
+
+@medir()
 def tratar_arquivo_hubspot(df):
     # Renomear colunas
-    colunas_renomeadas = {
-        'ID do registro.': 'id',
-        'Nome do negócio': 'nome',
-        'Data de criação': 'data_criado',
-        'CPF': 'cpf',
-        'Telefone': 'telefone',
-        'Convênio': 'convenio',
-        'Origem': 'origem',
-        'Campanha': 'tag_campanha',
-        'Proprietário original do negócio': 'vendedor',
-        'Tipo de Campanha': 'produto',
-        'Equipe da HubSpot': 'equipe',
-        'Etapa do negócio': 'etapa',
-        'Motivo de fechamento perdido': 'motivo_fechamento',
-        'Comissão total projetada': 'comissao_projetada',
-        'Valor': 'comissao_gerada',
-        'Proprietário do negócio': 'vendedor2',
-        'Date entered "CONTRATAÇÃO ( Pipeline de Vendas)"': 'data_contratacao',
-        'Date entered "LEAD ( Pipeline de Vendas)"': 'data_lead',
-        'Date entered "NEGOCIAÇÃO ( Pipeline de Vendas)"': 'data_negociacao',
-        'Date entered "PAGO ( Pipeline de Vendas)"': 'data_pago',
-        'Date entered "PERDA ( Pipeline de Vendas)"': 'data_perda',
-        'Detalhes do motivo de perda': 'detalhe_perda',
-        'Comissão Konsigleads': 'comissao_paga'
-    }
-    df = df.rename(columns=colunas_renomeadas)
+    df = df.rename(columns=COLUNAS_HUBSPOT)
 
     # Agrupamento de motivos
     motivos_principais = {
@@ -39,46 +86,15 @@ def tratar_arquivo_hubspot(df):
     df['motivo_fechamento_agrupado'] = df['motivo_fechamento'].apply(
         lambda x: x if x in motivos_principais else 'Outros'
     )
+    # Grupo do motivo de perda, usando também o detalhe em texto livre
+    df['motivo_perda_grupo'] = motivos_perda.classificar_motivos(df)
 
     # Função auxiliar para acrônimos de convênio
     def criar_acronimo(convenio):
         if not isinstance(convenio, str):
             return ''
         convenio = convenio.lower()
-        mapeamento = {
-            'prefeitura de recife': 'PREF REC',
-            'prefeitura de curitiba': 'PREF CUR',
-            'prefeitura de maringá': 'PREF MAR',
-            'prefeitura de goiânia': 'PREF GOI',
-            'prefeitura de belo horizonte': 'PREF BH',
-            'governo de rondônia': 'GOV RO',
-            'governo do paraná': 'GOV PR',
-            'prefeitura de são paulo': 'PREF SP',
-            'governo de são paulo': 'GOV SP',
-            'prefeitura do rio de janeiro': 'PREF RJ',
-            'governo do rio de janeiro': 'GOV RJ',
-            'prefeitura de salvador': 'PREF SSA',
-            'governo da bahia': 'GOV BA',
-            'governo de alagoas': 'GOV AL',
-            'governo do amazonas': 'GOV AM',
-            'governo do maranhão': 'GOV MA',
-            'governo de goiás': 'GOV GO',
-            'governo do ceará': 'GOV CE',
-            'governo de pernambuco': 'GOV PE',
-            'governo de mato grosso do sul': 'GOV MS',
-            'governo de mato grosso': 'GOV MT',
-            'governo do piauí': 'GOV PI',
-            'prefeitura de joão pessoa': 'PREF JP',
-            'governo de minas gerais': 'GOV MG',
-            'governo de santa catarina': 'GOV SC',
-            'inss': 'INSS',
-            'siape': 'SIAPE',
-            'tribunal de justiça de são paulo (tjsp)': 'TJSP',
-            'governo do espírito santo': 'GOV ES',
-            'marinha': 'Marinha',
-            'iniciativa privada': 'CLT'
-        }
-        return mapeamento.get(convenio, convenio)
+        return MAPEAMENTO_CONVENIOS.get(convenio, convenio)
 
     df['convenio_acronimo'] = df['convenio'].apply(criar_acronimo)
 
@@ -98,14 +114,14 @@ def tratar_arquivo_hubspot(df):
         df.loc[df['equipe'].str.contains(chave, case=False, na=False), 'equipe'] = valor
 
     # Converter colunas de data
-    df['data_criado'] = pd.to_datetime(df['data_criado'], errors='coerce')
-    df['data'] = df['data_criado'].dt.date
-    df['horario_criado'] = df['data_criado'].dt.time
+    df['data_criado'], df['data'] = datas.converter_datas_e_date(df['data_criado'])
+    df['dia_num'] = calendario.numero_dia(df['data_criado'])
+    # Minuto do dia (0-1439) como inteiro; -1 quando a data não pôde ser lida
+    df['minuto_dia'] = (df['data_criado'].dt.hour * 60 + df['data_criado'].dt.minute).fillna(-1).astype('int16')
     df.drop(columns=['data_criado'], inplace=True)
 
-    colunas_data_extra = ['data_lead', 'data_negociacao', 'data_contratacao', 'data_pago']
-    for coluna in colunas_data_extra:
-        df[coluna] = pd.to_datetime(df[coluna], errors='coerce').dt.date
+    for coluna in COLUNAS_DATA_ETAPA:
+        df[coluna] = datas.converter_para_date(df[coluna])
 
     df.loc[df['equipe'] == 'Cs Cdx', 'produto'] = 'CDX'
     df.loc[df['equipe'] == 'Cs Cp', 'produto'] = 'CP'
@@ -119,15 +135,104 @@ def tratar_arquivo_hubspot(df):
     return df
 
 
+# Tarifa por disparo usada no arquivo de gasto
+TARIFAS_CANAL = {'SMS': 0.047, 'RCS': 0.105, 'HYPERFLOW': 0.04672, 'Whatsapp': 0.04672}
+
+
+@medir()
 def tratar_arquivo_pagos(dataframe):
-    dataframe['data'] = pd.to_datetime(dataframe['Data'], errors='coerce', dayfirst=True).dt.date
-    dataframe['Valor Gasto'] = (dataframe['Canal'].map({'SMS': 0.047, 'RCS': 0.105, 'HYPERFLOW': 0.04672, 'Whatsapp': 0.04672}) * dataframe['Quantidade']).round(2)
+    data, dataframe['data'] = datas.converter_datas_e_date(dataframe['Data'], dayfirst=True)
+    dataframe['dia_num'] = calendario.numero_dia(data)
+    dataframe['Valor Gasto'] = (dataframe['Canal'].map(TARIFAS_CANAL) * dataframe['Quantidade']).round(2)
     return dataframe
 
 
-def filtrar_dias_uteis(df, data_inicio, data_fim, considerar_dias_uteis):
+# Coluna de data que indica a entrada em cada etapa do funil
+COLUNAS_ETAPA = {
+    'Lead': 'data',
+    'Negociação': 'data_negociacao',
+    'Contratação': 'data_contratacao',
+    'Pago': 'data_pago',
+    'Perda': 'data_perda'
+}
+
+
+# Custo unitário de cada disparo por canal
+CUSTOS_UNITARIOS = {'SMS': 0.048, 'RCS': 0.105, 'HYPERFLOW': 0.047, 'Whatsapp': 0.046}
+
+
+@medir()
+def calcular_gastos(df_gasto):
+    gastos = (
+        df_gasto.groupby(['Equipe', 'Convênio', 'Produto', 'Canal', ])['Quantidade']
+        .sum()
+        .reset_index()
+    )
+
+    gastos['valor_pago'] = gastos['Canal'].map(CUSTOS_UNITARIOS) * gastos['Quantidade']
+    gastos['valor_pago'] = gastos['valor_pago'].round(2)
+    return gastos
+
+
+# Seleção de linhas: combina as máscaras em um único array booleano e devolve
+# as posições selecionadas, sem materializar DataFrames intermediários
+def _mascara_dimensoes(df, colunas, inicio, fim, filtros, considerar_dias_uteis, coluna_convenio):
+    datas = df['data']
+    mascara = (datas >= inicio).to_numpy(copy=True)
+    mascara &= (datas <= fim).to_numpy()
+    for coluna, chave in colunas.items():
+        mascara &= df[coluna].isin(filtros[chave]).to_numpy()
     if considerar_dias_uteis:
-        dias_uteis = pd.bdate_range(start=data_inicio, end=data_fim)
-        return df[df['data'].isin(dias_uteis.date)]
-    return df
+        mascara &= mascara_dias_uteis(df, inicio, fim, coluna_convenio)
+    return mascara
+
 
+@medir()
+def selecionar_linhas(df, filtros, etapa_filtro, data_inicio, data_fim, considerar_dias_uteis=False, somente_unicos=False):
+    colunas = {'equipe': 'equipe', 'produto': 'produto', 'convenio_acronimo': 'convenio_acronimo', 'origem': 'origem'}
+    mascara = _mascara_dimensoes(df, colunas, data_inicio, data_fim, filtros, considerar_dias_uteis, 'convenio_acronimo')
+
+    # Mantém apenas os negócios que chegaram à etapa selecionada
+    mascara &= df[COLUNAS_ETAPA[etapa_filtro]].notna().to_numpy()
+
+    # Descarta os negócios de pessoas que já tinham um primeiro contato anterior
+    if somente_unicos and 'duplicado' in df:
+        mascara &= ~df['duplicado'].to_numpy()
+    return np.flatnonzero(mascara)
+
+
+@medir()
+def selecionar_linhas_gasto(df_gasto, filtros, data_inicio, data_fim, considerar_dias_uteis=False):
+    colunas = {'Convênio': 'convenio_acronimo', 'Produto': 'produto', 'Equipe': 'equipe', 'Canal': 'origem'}
+    mascara = _mascara_dimensoes(df_gasto, colunas, data_inicio, data_fim, filtros, considerar_dias_uteis, 'Convênio')
+    return np.flatnonzero(mascara)
+
+
+# Materializa os recortes uma única vez, a partir das posições selecionadas
+@medir()
+def aplicar_filtros(df, df_gasto, filtros, etapa_filtro, data_inicio, data_fim, considerar_dias_uteis=False,
+                    somente_unicos=False):
+    linhas = selecionar_linhas(df, filtros, etapa_filtro, data_inicio, data_fim, considerar_dias_uteis, somente_unicos)
+    linhas_gasto = selecionar_linhas_gasto(df_gasto, filtros, data_inicio, data_fim, considerar_dias_uteis)
+    return df.iloc[linhas], df_gasto.iloc[linhas_gasto]
+
+
+# Dias úteis pelo calendário: fins de semana, feriados nacionais e, se houver
+# coluna de convênio, os feriados locais de cada convênio
+def _dias_num(df):
+    return df['dia_num'].to_numpy() if 'dia_num' in df else calendario.numero_dia(df['data'])
+
+
+def mascara_dias_uteis(df, data_inicio, data_fim, coluna_convenio=None):
+    convenios = df[coluna_convenio].to_numpy() if coluna_convenio else None
+    return calendario.obter_calendario(data_inicio, data_fim).mascara(_dias_num(df), convenios)
+
+
+@medir()
+def filtrar_dias_uteis(df, data_inicio, data_fim, considerar_dias_uteis, coluna_convenio=None):
+    if considerar_dias_uteis:
+        dias_num = _dias_num(df)
+        mascara = mascara_dias_uteis(df, data_inicio, data_fim, coluna_convenio)
+        mascara &= (dias_num >= calendario.numero_dia([data_inicio])[0]) & (dias_num <= calendario.numero_dia([data_fim])[0])
+        return df[mascara]
+    return df
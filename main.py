@@ -1,11 +1,16 @@
 import streamlit as st
-import pandas as pd
+import io
+import json
 import locale
-import limpeza
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import timedelta
-from graficos import aplicar_estilo_kpi, exibir_kpis
+import os
+import dados_compartilhados
+import perfil
+
+# pandas, limpeza e graficos (que carrega o plotly) são importados sob demanda,
+# para que o widget de upload apareça sem esperar pelos módulos pesados
+
+# Snapshots diários gerados pelo job agendado (python snapshot.py)
+DIRETORIO_SNAPSHOTS = os.environ.get('CAMPANHAS_SNAPSHOTS', 'snapshots')
 
 # Função para download do DataFrame
 def download_button(df, filename="dados.csv"):
@@ -32,33 +37,181 @@ try:
 except locale.Error:
     locale.setlocale(locale.LC_ALL, 'C.UTF-8')
 
-# Função de cache para o carregamento de arquivos
+# Carregamento dos arquivos via armazenamento compartilhado entre sessões.
+# A sessão guarda apenas as referências; o DataFrame tratado é único por conteúdo.
+def _tratar(conteudo, tratamento):
+    return lambda: tratamento(pd.read_csv(io.BytesIO(conteudo)))
+
+
+# HubSpot tratado e validado: DataFrame válido e quarentena das linhas inválidas; o
+# mesmo tratamento do snapshot diário. Depende só do conteúdo do arquivo.
+def _tratar_hubspot(df):
+    return perfil.importar("validacao").validar_e_separar_hubspot(limpeza.tratar_arquivo_hubspot(df), df)
+
+
+def _tratar_gasto(df):
+    return perfil.importar("validacao").validar_e_separar_gasto(limpeza.tratar_arquivo_pagos(df))
+
 
-def carregar_arquivos(arquivos):
+@perfil.medir()
+def carregar_arquivos(arquivos, referencias_anteriores, referencias, quarentenas):
     df, df_gasto = None, None
     for arquivo in arquivos:
         nome_arquivo = arquivo.name.lower()
         if "hubspot" in nome_arquivo:
-            df = pd.read_csv(arquivo)
-            df = limpeza.tratar_arquivo_hubspot(df)
+            tipo, tratamento = "hubspot", _tratar_hubspot
         elif "gasto" in nome_arquivo:
-            df_gasto = pd.read_csv(arquivo)
-            df_gasto = limpeza.tratar_arquivo_pagos(df_gasto)
+            tipo, tratamento = "gasto", _tratar_gasto
+        else:
+            continue
+
+        referencia = referencias_anteriores.get(arquivo.file_id)
+        if referencia is None:
+            conteudo = arquivo.getvalue()
+            referencia = dados_compartilhados.obter(conteudo, tipo, _tratar(conteudo, tratamento))
+        referencias[arquivo.file_id] = referencia
+
+        dados, quarentenas[tipo] = referencia.dados
+        if tipo == "hubspot":
+            df = dados
+        else:
+            df_gasto = dados
     return df, df_gasto
 
 
+# Duplicados (CPF/telefone) marcados contra um estado explícito do índice, fora do
+# tratamento em cache: a versão do índice entra na chave, então o mesmo arquivo contra
+# o mesmo histórico dá as mesmas marcas em todas as sessões
+@perfil.medir()
+def marcar_duplicados(df, indice, referencias):
+    deduplicacao = perfil.importar("deduplicacao")
+    chave = next(r.chave for r in referencias.values() if r.chave.startswith("hubspot:") and r.dados[0] is df)
+    referencias["duplicados:hubspot"] = dados_compartilhados.obter(
+        f"{chave}|{indice.versao}".encode(), "duplicados_hubspot",
+        lambda: deduplicacao.marcar_duplicados(df, indice)
+    )
+    return referencias["duplicados:hubspot"].dados
+
+
+# Base tratada do snapshot; o manifesto (com o horário de geração) identifica o conteúdo
+@perfil.medir()
+def carregar_snapshot(caminho, manifesto, referencias, quarentenas):
+    conteudo = json.dumps(manifesto, sort_keys=True).encode()
+    for tipo in ("hubspot", "gasto"):
+        referencias[f"snapshot:{tipo}"] = dados_compartilhados.obter(
+            conteudo, f"snapshot_{tipo}", lambda tipo=tipo: snapshot.carregar(caminho, tipo)
+        )
+        quarentenas[f"snapshot:{tipo}"] = referencias[f"snapshot:{tipo}"].dados[1]
+
+
+# O export enviado no dia (delta) entra por cima da base do snapshot; a combinação
+# também fica no armazenamento compartilhado, identificada pelas duas partes
+@perfil.medir()
+def combinar_com_snapshot(manifesto, df_delta, df_gasto_delta, referencias):
+    corte = pd.Timestamp(manifesto["corte"]).date()
+    combinacoes = {
+        "hubspot": (df_delta, snapshot.combinar_hubspot),
+        "gasto": (df_gasto_delta, lambda base, delta: snapshot.combinar_gasto(base, delta, corte)),
+    }
+    resultado = {}
+    for tipo, (delta, combinar) in combinacoes.items():
+        base = referencias[f"snapshot:{tipo}"].dados[0]
+        if delta is None:
+            resultado[tipo] = base
+            continue
+        # O delta do HubSpot entra já marcado: a chave dele inclui a versão do índice
+        partes = sorted(
+            r.chave for r in referencias.values()
+            if r.chave.startswith((f"{tipo}:", f"snapshot_{tipo}:", f"duplicados_{tipo}:"))
+        )
+        referencias[f"combinado:{tipo}"] = dados_compartilhados.obter(
+            "|".join(partes).encode(), f"combinado_{tipo}",
+            lambda base=base, delta=delta, combinar=combinar: combinar(base, delta)
+        )
+        resultado[tipo] = referencias[f"combinado:{tipo}"].dados
+    return resultado["hubspot"], resultado["gasto"]
+
+
 # Uploads
 st.sidebar.header("Upload dos Arquivos")
 arquivos = st.sidebar.file_uploader("Envie os arquivos CSV", type="csv", accept_multiple_files=True)
 considerar_dias_uteis = st.sidebar.checkbox("Considerar apenas dias úteis", value=False)
+somente_unicos = st.sidebar.checkbox("Desconsiderar leads duplicados (CPF/telefone)", value=False)
+
+# Com snapshot diário, o painel parte dele e os uploads do dia entram como delta.
+# O manifesto é lido uma vez por execução
+caminho_snapshot, manifesto = None, None
+if os.path.isdir(DIRETORIO_SNAPSHOTS) and st.sidebar.checkbox("Partir do último snapshot diário", value=True):
+    snapshot = perfil.importar("snapshot")
+    caminho_snapshot = snapshot.ultimo(DIRETORIO_SNAPSHOTS)
+    manifesto = snapshot.ler_manifesto(caminho_snapshot) if caminho_snapshot else None
+
+# Instrumentação de desempenho
+mostrar_perfil = st.sidebar.checkbox("Mostrar perfil de execução", value=False)
+gerar_cprofile = st.sidebar.button("Gerar cProfile desta execução")
+perfil.iniciar_execucao(medir_memoria=mostrar_perfil)
+perfilador = perfil.iniciar_cprofile() if gerar_cprofile else None
+
+
+# Renderiza o gráfico compactado, medindo a serialização e o tamanho enviado ao navegador;
+# figuras do pré-cálculo já chegam compactadas
+def exibir_grafico(fig, nome, drill=False, compactada=False, **kwargs):
+    compactacao = perfil.importar("compactacao")
+    with perfil.etapa(f"render {nome}") as registro:
+        if not compactada:
+            fig = compactacao.compactar(fig, manter_customdata=drill)
+        if mostrar_perfil:
+            registro["payload_kb"] = compactacao.tamanho_kb(fig)
+        return st.plotly_chart(fig, **kwargs)
+
+
+# Clique em uma barra acrescenta um passo de drill-down
+def _registrar_drill(nome, chave):
+    filtro_cruzado = perfil.importar("filtro_cruzado")
+    evento = st.session_state.get(chave)
+    passo = filtro_cruzado.passo_do_evento(nome, evento['selection']['points']) if evento else None
+    passos = st.session_state.setdefault('drill', [])
+    if passo and passo not in passos:
+        passos.append(passo)
+
+
+def exibir_grafico_drill(fig, nome, chave, **kwargs):
+    return exibir_grafico(
+        fig, nome, drill=True, key=chave, on_select=lambda: _registrar_drill(nome, chave), selection_mode="points", **kwargs
+    )
 
-df, df_gasto = None, None
 
-if arquivos:
-    df, df_gasto = carregar_arquivos(arquivos)
+def _voltar_drill(n):
+    st.session_state['drill'] = st.session_state.get('drill', [])[:n]
+
+df, df_gasto = None, None
+quarentenas = {}
+
+if arquivos or caminho_snapshot:
+    pd = perfil.importar("pandas")
+    limpeza = perfil.importar("limpeza")
+    referencias = {}
+    if caminho_snapshot:
+        carregar_snapshot(caminho_snapshot, manifesto, referencias, quarentenas)
+    df, df_gasto = carregar_arquivos(
+        arquivos or [], st.session_state.get('referencias_dados', {}), referencias, quarentenas
+    )
+    com_delta = df is not None or df_gasto is not None
+    if df is not None:
+        # Com snapshot, o delta é marcado contra o índice gravado nele; sem, contra o histórico persistido
+        if caminho_snapshot:
+            indice = snapshot.carregar_indice(caminho_snapshot, manifesto["gerado_em"])
+        else:
+            indice = perfil.importar("deduplicacao").indice_global()
+        df = marcar_duplicados(df, indice, referencias)
+    if caminho_snapshot:
+        df, df_gasto = combinar_com_snapshot(manifesto, df, df_gasto, referencias)
+    # Substituir o dicionário libera as referências de arquivos removidos
+    st.session_state['referencias_dados'] = referencias
+else:
+    st.session_state.pop('referencias_dados', None)
 
 if df is not None and df_gasto is not None:
-    df_filtrado = df.copy()
     st.sidebar.title("Filtros")
 
     def multiselect_com_default(label, opcoes):
@@ -86,112 +239,158 @@ if df is not None and df_gasto is not None:
         data_fim = st.date_input('Data de fim', df['data'].max())
 
 
-    # Aplicando filtros adicionais com base nas datas e outros critério
-    df_filtrado = df_filtrado[
-        (df_filtrado['data'] >= data_inicio) & 
-        (df_filtrado['data'] <= data_fim) & 
-        (df_filtrado['equipe'].isin(filtros['equipe'])) & 
-        (df_filtrado['produto'].isin(filtros['produto'])) & 
-        (df_filtrado['convenio_acronimo'].isin(filtros['convenio_acronimo'])) & 
-        (df_filtrado['origem'].isin(filtros['origem']))
-    ]
-
-    # Corrigindo possíveis valores inválidos nas datas de etapa
-    colunas_datas = ['data_negociacao', 'data_perda', 'data_contratacao', 'data_pago', 'data']
-
-    # Filtrando df_filtrado com base na etapa selecionada
-    if etapa_filtro == "Lead":
-        df_filtrado = df_filtrado[df_filtrado['data'].notna()]    
-    elif etapa_filtro == "Negociação":
-        df_filtrado = df_filtrado[df_filtrado['data_negociacao'].notna()]
-    elif etapa_filtro == "Perda":
-        df_filtrado = df_filtrado[df_filtrado['data_perda'].notna()]
-    elif etapa_filtro == "Contratação":
-        df_filtrado = df_filtrado[df_filtrado['data_contratacao'].notna()]
-    elif etapa_filtro == "Pago":
-        df_filtrado = df_filtrado[df_filtrado['data_pago'].notna()]
-    
+    # Primeiro uso do plotly: só carrega quando há dados para exibir
+    graficos = perfil.importar("graficos")
+    pre_calculo = perfil.importar("pre_calculo")
 
-    df_gasto = df_gasto[
-        (df_gasto['data'] >= data_inicio) & (df_gasto['data'] <= data_fim) & 
-        (df_gasto['Convênio'].isin(filtros['convenio_acronimo'])) & 
-        (df_gasto['Produto'].isin(filtros['produto'])) & 
-        (df_gasto['Equipe'].isin(filtros['equipe'])) & 
-        (df_gasto['Canal'].isin(filtros['origem']))
-    ]
-
-    # Filtrar por dias úteis
-    df_filtrado = limpeza.filtrar_dias_uteis(df_filtrado, data_inicio, data_fim, considerar_dias_uteis)
-    df_gasto = limpeza.filtrar_dias_uteis(df_gasto, data_inicio, data_fim, considerar_dias_uteis)
-
-    # Custos unitários e cálculo de gastos
-    custos_unitarios = {'SMS': 0.048, 'RCS': 0.105, 'HYPERFLOW': 0.047, 'Whatsapp': 0.046}
-    gastos = (
-        df_gasto.groupby(['Equipe', 'Convênio', 'Produto', 'Canal', ])['Quantidade']
-        .sum()
-        .reset_index()
+    # Filtros, gastos e KPIs do estado atual: vêm do pré-cálculo quando já foram
+    # calculados em segundo plano, senão são calculados agora em uma única passada
+    chave_dados = tuple(sorted(r.chave for r in st.session_state['referencias_dados'].values()))
+    estado = pre_calculo.novo_estado(
+        chave_dados, filtros, etapa_filtro, data_inicio, data_fim, considerar_dias_uteis, somente_unicos
     )
-
-    gastos['valor_pago'] = gastos['Canal'].map(custos_unitarios) * gastos['Quantidade']
-    gastos['valor_pago'] = gastos['valor_pago'].round(2)
+    pre_calculador = st.session_state.setdefault('pre_calculador', pre_calculo.PreCalculador())
+    pre_calculador.nova_execucao(estado)
+    resultado = pre_calculador.obter(df, df_gasto, estado)
+    linhas, linhas_gasto = resultado['linhas'], resultado['linhas_gasto']
+    gastos, kpis = resultado['gastos'], resultado['kpis']
+
+    # Drill-down por cliques nos gráficos: intersecta as posições já filtradas
+    if st.session_state.get('drill_dados') != chave_dados:
+        st.session_state['drill_dados'] = chave_dados
+        st.session_state['drill'] = []
+    passos = st.session_state.get('drill', [])
+    if passos:
+        filtro_cruzado = perfil.importar("filtro_cruzado")
+        linhas, linhas_gasto = filtro_cruzado.aplicar(df, df_gasto, linhas, linhas_gasto, passos)
+        gastos = limpeza.calcular_gastos(df_gasto.iloc[linhas_gasto])
+        convenios_drill = [p['convenio_acronimo'] for p in passos if 'convenio_acronimo' in p]
+        kpis = pre_calculo.calcular_kpis(df, linhas, gastos, estado, convenios_drill[-1:] or None)
+
+        trilha = st.columns(len(passos) + 1)
+        trilha[0].button("Todos", on_click=_voltar_drill, args=(0,), key="drill_0")
+        for i, passo in enumerate(passos, start=1):
+            trilha[i].button(f"› {filtro_cruzado.descrever(passo)}", on_click=_voltar_drill, args=(i,), key=f"drill_{i}")
+
+    df_gasto_total = df_gasto
+    df_filtrado = df.iloc[linhas]
+    df_gasto = df_gasto.iloc[linhas_gasto]
+
+    # Sem nada que exija as linhas, KPIs, funil, perdas e cohort saem dos agregados do snapshot
+    painel_agregado = None
+    if caminho_snapshot and snapshot.atende(manifesto, etapa_filtro, data_fim, com_delta, bool(passos)):
+        painel_agregado = snapshot.PainelAgregado(
+            caminho_snapshot, manifesto, filtros, data_inicio, data_fim, considerar_dias_uteis, somente_unicos
+        )
+        kpis = painel_agregado.kpis()
+
+    # Linhas separadas na validação da ingestão (do snapshot e do export do dia)
+    validacao = perfil.importar("validacao")
+    quarentenas = {
+        nome: validacao.juntar_quarentenas([quarentenas.get(f"snapshot:{tipo}"), quarentenas.get(tipo)])
+        for nome, tipo in [("HubSpot", "hubspot"), ("Gasto", "gasto")]
+    }
+    quarentenas = {nome: q for nome, q in quarentenas.items() if q is not None and len(q[0])}
+    if quarentenas:
+        total_quarentena = sum(len(q[0]) for q in quarentenas.values())
+        with st.expander(f"Quarentena da ingestão ({total_quarentena} linhas fora da análise)"):
+            for nome, (tabela_quarentena, contagens) in quarentenas.items():
+                st.subheader(nome)
+                st.write(pd.DataFrame(
+                    [(validacao.REGRAS[r], n) for r, n in contagens.items() if n],
+                    columns=["Regra", "Linhas"]
+                ))
+                st.write(tabela_quarentena)
+                download_button(tabela_quarentena, filename=f"quarentena_{nome.lower()}.csv")
+
+    # Agregados materializados do snapshot, recortados pelos filtros sem tocar nas linhas
+    if caminho_snapshot:
+        with st.expander(f"Snapshot diário de {manifesto['corte']}"):
+            st.caption(
+                f"Gerado em {manifesto['gerado_em']} a partir de {manifesto['arquivos']['hubspot']['nome']} e "
+                f"{manifesto['arquivos']['gasto']['nome']}; agregados dos dias anteriores a {manifesto['corte']}. "
+                + ("KPIs, funil, perdas e cohort desta visão vêm dos agregados." if painel_agregado else
+                   "KPIs e gráficos desta visão vêm das linhas: há export do dia, drill-down, etapa diferente "
+                   "de Lead ou período com dias ainda não fechados.")
+            )
+            nome_agregado = st.selectbox("Agregado", manifesto['agregados'])
+            recorte = snapshot.recortar(
+                snapshot.carregar_agregado(caminho_snapshot, nome_agregado, manifesto['gerado_em']),
+                filtros, data_inicio, data_fim, considerar_dias_uteis, somente_unicos
+            )
+            st.write(snapshot.resumir(recorte))
+            download_button(recorte, filename=f"snapshot_{nome_agregado}.csv")
+
+    # Figuras sobre o recorte do estado, já compactadas. Sem drill-down vêm do cache do
+    # pré-cálculo (montadas em segundo plano ou por outra sessão) ou são montadas e guardadas
+    # nele; os parâmetros dos widgets entram na chave e valem para os estados vizinhos
+    figuras_exibidas = []
+
+    def montar_figura(nome, parametros=(), construir=None):
+        if construir is None:
+            construir = lambda: pre_calculo.FIGURAS[nome](df_filtrado, df_gasto, *parametros)
+        if passos:
+            return pre_calculo.montar_figura(nome, construir)
+        figuras_exibidas.append((nome, parametros))
+        return pre_calculo.figura(estado, resultado, nome, parametros, construir)
 
     # Exibir os KPIs
-    aplicar_estilo_kpi()
+    graficos.aplicar_estilo_kpi()
     colunas = st.columns(6)
-    exibir_kpis(df, df_filtrado, gastos, data_inicio, data_fim, considerar_dias_uteis, colunas)
+    graficos.exibir_kpis(
+        df, df_filtrado, gastos, data_inicio, data_fim, considerar_dias_uteis, colunas, kpis=kpis
+    )
 
 
 
     # GRAFICO 1 - GASTOS POR CADA CONVENIO/PRODUTO
-    from graficos import grafico_gasto_convenio_produto
     with st.expander("Gasto por Convênio e Produto"):
         top_n = st.slider("Quantos convênios deseja visualizar?", min_value=5, max_value=40, value=5, step=1, key=1)
-        fig = grafico_gasto_convenio_produto(df_filtrado, df_gasto, top_n)
-        st.plotly_chart(fig, key=f'graf1')
+        fig = montar_figura('grafico_gasto_convenio_produto', (top_n,))
+        exibir_grafico_drill(fig, 'grafico_gasto_convenio_produto', 'graf1', compactada=True)
     
     
 
     # GRAFICO 2 - QUANTIDADE DE LEADS POR ORIGEM
-    from graficos import leads_por_origem
     with st.expander("Quantidade de Leads por Origem"):
         top_n = st.slider("Quantos convênios deseja visualizar?", min_value=5, max_value=40, value=5, step=1, key=2)
-        fig = leads_por_origem(df_filtrado, df_gasto, top_n)
-        st.plotly_chart(fig, key=f'graf2')
+        fig = montar_figura('leads_por_origem', (top_n,))
+        exibir_grafico(fig, 'leads_por_origem', compactada=True, key=f'graf2')
 
     # GRAFICO 3 - FUNIL DE ETAPAS
-    from graficos import funil_de_etapas
     with st.expander("Funil de Geração de leads por Etapa"):
-        fig = funil_de_etapas(df_filtrado, df_gasto)
-        st.plotly_chart(fig, key=f'graf3')
+        fig = montar_figura('funil_de_etapas', construir=lambda: graficos.funil_de_etapas(
+            df_filtrado, df_gasto, painel_agregado.funil() if painel_agregado else None
+        ))
+        exibir_grafico(fig, 'funil_de_etapas', compactada=True, key=f'graf3')
 
     # GRAFICO 4 - COHORT DINAMICO
-    from graficos import cohort_dinamico
     with st.expander("Cohort dinâmico para Etapas"):
         top_n = st.slider("Quantos convênios deseja visualizar?", min_value=5, max_value=40, value=5, step=1, key=3)
-        fig = cohort_dinamico(df_filtrado, df_gasto)
-        st.plotly_chart(fig, use_container_width=True)
+        evento_cohort = st.selectbox("Selecione o evento para análise de cohort:", list(graficos.EVENTOS_COHORT))
+        fig = montar_figura('cohort_dinamico', (evento_cohort,), lambda: graficos.cohort_dinamico(
+            df_filtrado, df_gasto, painel_agregado.cohort if painel_agregado else None, evento_cohort
+        ))
+        exibir_grafico(fig, 'cohort_dinamico', compactada=True, use_container_width=True)
 
     # GRAFICO 5 - CPL por Convênio/Produto
-    from graficos import cpl_convenios_produto
     with st.expander("Custo por Lead (Convenio-Produto)"):
         top_n = st.slider("Quantos convênios deseja visualizar?", min_value=5, max_value=40, value=5, step=1, key=4)
         tipo_cpl = st.selectbox("Tipo de CPL que deseja visualizar:", ["Maiores CPLs", "Menores CPLs"], key="cpl_tipo")
 
         maiores = tipo_cpl == "Maiores CPLs"
-        fig = cpl_convenios_produto(df_filtrado, df_gasto, top_n=top_n, maiores=maiores)
-        st.plotly_chart(fig)
+        fig = montar_figura('cpl_convenios_produto', (top_n, maiores))
+        exibir_grafico(fig, 'cpl_convenios_produto', compactada=True)
 
     # GRAFICO 6 - ROI por Convênio/Produto
-    from graficos import roi_por_convenio_produto
     with st.expander("ROI por Convênio/Produto"):
         top_n = st.slider("Quantos convênios deseja visualizar?", min_value=5, max_value=40, value=5, step=1, key=5)
         tipo_roi = st.selectbox("Tipo de ROI que deseja visualizar:", ["Melhores ROIs", "Piores ROIs"], key="roi_tipo")
         
         melhores = tipo_roi == "Melhores ROIs"
-        fig = roi_por_convenio_produto(df_filtrado, df_gasto, top_n=top_n, melhores=melhores)
-        st.plotly_chart(fig)
+        fig = montar_figura('roi_por_convenio_produto', (top_n, melhores))
+        exibir_grafico(fig, 'roi_por_convenio_produto', compactada=True)
 
-    from graficos import quantidade_leads_por_convenio
     with st.expander("Quantidade de Leads por Convênio"):
         col1, col2 = st.columns([2, 1])
         with col1:
@@ -199,40 +398,139 @@ if df is not None and df_gasto is not None:
         with col2:
             ordem = st.selectbox("Ordenar por:", options=["maiores", "menores"], index=0, key=61)
         
-        fig = quantidade_leads_por_convenio(df_filtrado, df_gasto, top_n=top_n, ordem=ordem)
-        st.plotly_chart(fig)
+        fig = montar_figura('quantidade_leads_por_convenio', (top_n, ordem))
+        exibir_grafico_drill(fig, 'quantidade_leads_por_convenio', 'graf_leads_convenio', compactada=True)
 
 
-    from graficos import roi_por_canal, gasto_vs_comissao_por_canal
     with st.expander("Análise de ROI e Gasto por Canal"):
         col1, col2 = st.columns(2)
 
         with col1:
             st.subheader("Gasto x Comissão por Canal")
-            fig_comparativo = gasto_vs_comissao_por_canal(df_filtrado, df_gasto)
-            st.plotly_chart(fig_comparativo, use_container_width=True)
+            fig_comparativo = montar_figura('gasto_vs_comissao_por_canal')
+            exibir_grafico(fig_comparativo, 'gasto_vs_comissao_por_canal', compactada=True, use_container_width=True)
         
         with col2:
             st.subheader("ROI por Canal")
-            fig_roi = roi_por_canal(df_filtrado, df_gasto)
-            st.plotly_chart(fig_roi, use_container_width=True)
+            fig_roi = montar_figura('roi_por_canal')
+            exibir_grafico_drill(fig_roi, 'roi_por_canal', 'graf_roi_canal', compactada=True, use_container_width=True)
         
 
-    from graficos import perdas_por_etapa
     with st.expander("Perdas por Etapa"):
-        fig = perdas_por_etapa(df_filtrado)
-        st.plotly_chart(fig)
+        fig = montar_figura('perdas_por_etapa', construir=lambda: graficos.perdas_por_etapa(
+            df_filtrado, painel_agregado.perdas_etapa() if painel_agregado else None
+        ))
+        exibir_grafico(fig, 'perdas_por_etapa', compactada=True)
+
+    with st.expander("Perdas por Motivo"):
+        def _perdas_por_motivo():
+            tabela = painel_agregado.perdas_motivo() if painel_agregado else graficos.tabela_perdas_por_motivo(df_filtrado)
+            return graficos.perdas_por_motivo(df_filtrado, perdas=tabela), tabela
+
+        fig, tabela_motivos = montar_figura('perdas_por_motivo', construir=_perdas_por_motivo)
+        exibir_grafico(fig, 'perdas_por_motivo', compactada=True, use_container_width=True)
+        st.write(tabela_motivos)
+        download_button(tabela_motivos, filename="perdas_por_motivo.csv")
 
     
-    from graficos import grafico_leads_por_10k
     with st.expander("Leads estimados por 10k disparos"):
         top_n = st.slider("Quantos convênios deseja visualizar?", 5, 40, 10, 1)
         tipo_ordem = st.selectbox("Ordenar por:", ["maiores", "menores"])
         maiores = tipo_ordem == "maiores"
 
-        fig, merged_final = grafico_leads_por_10k(df_filtrado, df_gasto, top_n=top_n, maiores=maiores)
-        st.plotly_chart(fig, use_container_width=True)
+        fig, merged_final = montar_figura('grafico_leads_por_10k', (top_n, maiores))
+        exibir_grafico(fig, 'grafico_leads_por_10k', compactada=True, use_container_width=True)
         st.write(merged_final)
 
         # Adicionando o botão de download
         download_button(merged_final, filename="leads_por_10k.csv")
+
+    with st.expander("Leads por dia da semana e horário"):
+        origens_heatmap = st.multiselect(
+            "Separar por origem (vazio = todas juntas)", sorted(df_filtrado['origem'].dropna().unique()), max_selections=6
+        )
+        fig = montar_figura('heatmap_horario_leads', (tuple(origens_heatmap),))
+        exibir_grafico(fig, 'heatmap_horario_leads', compactada=True, use_container_width=True)
+
+    with st.expander("Ranking de vendedores"):
+        ranking_vendedores = perfil.importar("ranking_vendedores")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            coluna_vendedor = st.selectbox(
+                "Vendedor", ["vendedor2", "vendedor"],
+                format_func=lambda c: "Proprietário atual" if c == "vendedor2" else "Proprietário original"
+            )
+        with col2:
+            janela = st.selectbox("Janela (dias)", ranking_vendedores.JANELAS, index=1)
+        with col3:
+            top_vendedores = st.slider("Quantos vendedores deseja visualizar?", 5, 40, 15, 1)
+
+        # Janelas terminam na data de fim do filtro e respeitam equipe, produto, convênio e canal
+        ranking = ranking_vendedores.ranking_vendedores(
+            df, data_fim, coluna=coluna_vendedor, ordenar_por=janela, somente_unicos=somente_unicos, filtros=filtros
+        )
+        st.caption(
+            f"Janelas de 7, 30 e 90 dias até {data_fim:%d/%m/%Y}, com os filtros de equipe, produto, convênio e canal; "
+            "a etapa, a data de início, os dias úteis e o drill-down não se aplicam ao ranking."
+        )
+        fig = graficos.grafico_ranking_vendedores(ranking, janela, top_vendedores)
+        exibir_grafico(fig, 'grafico_ranking_vendedores', use_container_width=True)
+        st.write(ranking)
+        download_button(ranking, filename="ranking_vendedores.csv")
+
+    with st.expander("Atribuição de leads aos disparos"):
+        atribuicao = perfil.importar("atribuicao")
+        defasagem = st.slider("Janela de atribuição (dias após o disparo)", 0, 7, 3, 1)
+
+        serie_atribuida, _, leads_sem_disparo = atribuicao.atribuir_leads(df_filtrado, df_gasto, defasagem_max=defasagem)
+        fig = graficos.grafico_atribuicao_diaria(serie_atribuida)
+        exibir_grafico(fig, 'grafico_atribuicao_diaria', use_container_width=True)
+        st.caption(f"Leads sem disparo correspondente na janela: {leads_sem_disparo}")
+        st.write(serie_atribuida)
+        download_button(serie_atribuida, filename="atribuicao_diaria.csv")
+
+    with st.expander("Simulador de alocação de orçamento"):
+        simulador = perfil.importar("simulador")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            orcamento = st.number_input("Orçamento (R$)", min_value=100.0, value=10_000.0, step=1_000.0)
+        with col2:
+            candidatos = st.slider("Divisões avaliadas por rodada", 500, 20_000, 5_000, 500)
+        with col3:
+            quantil = st.selectbox("Critério", ["Lucro médio", "Lucro no pior cenário (P10)"])
+
+        if st.button("Simular alocação"):
+            historico = simulador.estatisticas_historicas(df_filtrado, df_gasto)
+            if historico.empty:
+                st.write("Sem histórico de disparos com custo conhecido para simular.")
+            else:
+                alocacao, resumo = simulador.simular_alocacao(
+                    historico, orcamento, candidatos=candidatos,
+                    quantil_risco=0.1 if quantil != "Lucro médio" else None
+                )
+                st.write(
+                    f"Lucro esperado: {graficos.formatar_moeda(resumo['lucro_medio'])} "
+                    f"(faixa de 90%: {graficos.formatar_moeda(resumo['lucro_p5'])} a "
+                    f"{graficos.formatar_moeda(resumo['lucro_p95'])}) | ROI médio: {resumo['roi_medio']:.2f}%"
+                )
+                fig = graficos.grafico_alocacao_orcamento(alocacao)
+                exibir_grafico(fig, 'grafico_alocacao_orcamento', use_container_width=True)
+                st.write(alocacao)
+                download_button(alocacao, filename="alocacao_orcamento.csv")
+
+    # Com a página pronta, pré-calcula as outras etapas e os períodos vizinhos, com as figuras exibidas
+    pre_calculador.agendar_vizinhos(df, df_gasto_total, estado, figuras_exibidas)
+
+
+# Relatórios de desempenho
+relatorio_cprofile = perfil.finalizar_cprofile(perfilador) if perfilador else None
+aviso_memoria = perfil.verificar_orcamento()
+if aviso_memoria:
+    st.sidebar.warning(aviso_memoria)
+if mostrar_perfil or relatorio_cprofile:
+    perfil.exibir_painel(relatorio_cprofile)
+if mostrar_perfil:
+    st.sidebar.caption(f"Dados compartilhados: {dados_compartilhados.estatisticas()}")
+    if 'pre_calculador' in st.session_state:
+        st.sidebar.caption(f"Pré-cálculo: {perfil.importar('pre_calculo').estatisticas()}")
+perfil.finalizar_execucao()
@@ -0,0 +1,81 @@
+# Classificação dos motivos de perda em grupos configuráveis.
+# O texto livre (motivo_fechamento e detalhe_perda) é normalizado e classificado
+# apenas uma vez por valor distinto: as linhas recebem o grupo por código
+# (pd.factorize), e os valores já vistos ficam em cache entre arquivos.
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Grupo -> palavras-chave (sem acentos, minúsculas; casam no início de uma palavra).
+# A ordem importa: vale o primeiro grupo que casar.
+GRUPOS_MOTIVO = {
+    'Opt-out / LGPD': ['lgpd', 'nao receber mensage', 'descadastr', 'bloque'],
+    'Contato inválido': ['telefone invalido', 'numero nao existe', 'numero invalido', 'numero errado', 'telefone errado'],
+    'Sem contato': ['sem interacao', 'nao atende', 'nao respondeu', 'sem resposta', 'nao retorn'],
+    'Sem interesse': ['sem interesse', 'nao tem interesse', 'respondeu nao', 'desistencia', 'desistiu'],
+    'Sem margem': ['margem', 'sem oportunidade', 'sem saldo'],
+    'Concorrência': ['outro banco', 'concorrente', 'ja possui contrato', 'ja fez'],
+    'Perfil inadequado': ['vinculo inadequado', 'nao elegivel', 'idade'],
+}
+OUTROS = 'Outros'
+SEM_MOTIVO = 'Sem motivo informado'
+
+# Cache texto original -> grupo (None quando nenhum grupo casou, SEM_MOTIVO quando vazio)
+LIMITE_CACHE = 200_000
+_cache = {}
+_trava = threading.Lock()
+
+
+def normalizar(textos):
+    texto = pd.Series(textos, dtype='object').fillna('').astype(str)
+    texto = texto.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+    return texto.str.lower().str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip()
+
+
+# Um padrão por grupo, aplicado de uma vez sobre todos os textos distintos
+def _classificar_textos(textos):
+    normalizados = normalizar(textos)
+    grupos = np.where(normalizados.to_numpy(dtype=object) == '', SEM_MOTIVO, None).astype(object)
+    pendentes = pd.isna(grupos)
+    for grupo, palavras in GRUPOS_MOTIVO.items():
+        padrao = r'\b(?:' + '|'.join(palavras) + ')'
+        casou = normalizados.str.contains(padrao, regex=True).to_numpy(dtype=bool) & pendentes
+        grupos[casou] = grupo
+        pendentes &= ~casou
+    return grupos
+
+
+# Grupo de cada linha (None quando há texto sem grupo), classificando só os valores
+# distintos ainda fora do cache
+def _grupos(valores):
+    codigos, unicos = pd.factorize(pd.Series(valores, dtype='object'))
+    unicos = list(unicos)
+    with _trava:
+        grupos = [_cache.get(u, _cache) for u in unicos]
+    novos = [u for u, g in zip(unicos, grupos) if g is _cache]
+    if novos:
+        classificados = dict(zip(novos, _classificar_textos(novos)))
+        grupos = [classificados[u] if g is _cache else g for u, g in zip(unicos, grupos)]
+        with _trava:
+            if len(_cache) + len(novos) > LIMITE_CACHE:
+                _cache.clear()
+            _cache.update(classificados)
+    # Código -1 (valor ausente) cai na última posição
+    return np.array(grupos + [SEM_MOTIVO], dtype=object)[codigos]
+
+
+# Grupo do motivo de perda; quando o motivo não casa, usa o detalhe em texto livre
+def classificar_motivos(df):
+    grupo = _grupos(df['motivo_fechamento'].to_numpy())
+    sem_grupo = np.flatnonzero(pd.isna(grupo) | (grupo == SEM_MOTIVO))
+    detalhe = _grupos(df['detalhe_perda'].to_numpy()[sem_grupo])
+
+    # Texto que não casou com nenhum grupo vira "Outros"; sem texto, "Sem motivo informado"
+    texto_sem_grupo = pd.isna(grupo[sem_grupo]) | pd.isna(detalhe)
+    grupo[sem_grupo] = np.where(
+        pd.isna(detalhe) | (detalhe == SEM_MOTIVO),
+        np.where(texto_sem_grupo, OUTROS, SEM_MOTIVO),
+        detalhe
+    )
+    return pd.Categorical(grupo, categories=list(GRUPOS_MOTIVO) + [OUTROS, SEM_MOTIVO])
@@ -0,0 +1,283 @@
+import cProfile
+import functools
+import importlib
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger("campanhas.perfil")
+
+# Orçamento de memória por execução do script, em MB (0 desativa o aviso).
+# Com orçamento ativo o tracemalloc fica ligado, o que deixa a execução mais lenta.
+# O tracemalloc mede o processo: com outras sessões ou o pré-cálculo rodando junto, o
+# pico comparado é o do processo, e o aviso diz isso.
+ORCAMENTO_MEMORIA_MB = float(os.environ.get("CAMPANHAS_ORCAMENTO_MEMORIA_MB", 0))
+
+# Estado por sessão: o Streamlit executa cada sessão em sua própria thread
+_estado = threading.local()
+
+# O tracemalloc é do processo inteiro. Execuções em andamento (thread -> mede memória) e
+# tarefas em segundo plano (pré-cálculo) ficam registradas: o tracemalloc só é desligado
+# quando nenhuma execução mede memória, e o pico só é zerado e atribuído a uma execução
+# enquanto ela roda sozinha. Qualquer mudança no conjunto avança a geração.
+_trava_execucoes = threading.Lock()
+_execucoes = {}
+_segundo_plano = [0]
+_geracao = [0]
+
+
+def _registros():
+    if not hasattr(_estado, "registros"):
+        _estado.registros = []
+        _estado.pilha = []
+        _estado.medir_memoria = False
+        _estado.base_execucao = 0
+        _estado.pico_raiz = 0
+        _estado.geracao = None
+    return _estado.registros
+
+
+# Execuções cuja thread já terminou (interrompidas antes de finalizar_execucao)
+def _podar_execucoes():
+    vivas = {t.ident for t in threading.enumerate()}
+    for ident in [i for i in _execucoes if i not in vivas]:
+        del _execucoes[ident]
+        _geracao[0] += 1
+
+
+# A execução atual roda sozinha desde o início (sem outras execuções nem segundo plano)
+def medicao_exclusiva():
+    with _trava_execucoes:
+        return getattr(_estado, "geracao", None) == _geracao[0]
+
+
+# Reinicia os registros no começo de cada execução do script
+def iniciar_execucao(medir_memoria=False):
+    medir_memoria = medir_memoria or ORCAMENTO_MEMORIA_MB > 0
+    _estado.registros = []
+    _estado.pilha = []
+    _estado.medir_memoria = medir_memoria
+    with _trava_execucoes:
+        _podar_execucoes()
+        _execucoes[threading.get_ident()] = medir_memoria
+        _geracao[0] += 1
+        sozinha = len(_execucoes) == 1 and not _segundo_plano[0]
+        _estado.geracao = _geracao[0] if sozinha else None
+        if medir_memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not any(_execucoes.values()) and tracemalloc.is_tracing():
+            tracemalloc.stop()
+    _estado.base_execucao = tracemalloc.get_traced_memory()[0] if medir_memoria else 0
+    _estado.pico_raiz = 0
+    if medir_memoria and sozinha:
+        tracemalloc.reset_peak()
+
+
+# Fim da execução do script: deixa de contar como execução em andamento
+def finalizar_execucao():
+    with _trava_execucoes:
+        if _execucoes.pop(threading.get_ident(), None) is not None:
+            _geracao[0] += 1
+
+
+# Trabalho em segundo plano (ex.: pré-cálculo): enquanto roda, as execuções não têm
+# medição exclusiva de memória
+@contextmanager
+def segundo_plano():
+    with _trava_execucoes:
+        _segundo_plano[0] += 1
+        _geracao[0] += 1
+    try:
+        yield
+    finally:
+        with _trava_execucoes:
+            _segundo_plano[0] -= 1
+            _geracao[0] += 1
+
+
+def registros():
+    return list(_registros())
+
+
+# Descarta os registros da thread sem mexer no tracemalloc (threads de segundo plano)
+def limpar_registros():
+    _registros()
+    _estado.registros = []
+    _estado.pilha = []
+    _estado.medir_memoria = False
+
+
+# DataFrames e Series sem importar o pandas (o perfil é carregado antes dele)
+def _e_tabela(obj):
+    return hasattr(obj, "shape") and hasattr(obj, "iloc")
+
+
+def _contar_linhas(obj):
+    if _e_tabela(obj):
+        return len(obj)
+    if isinstance(obj, tuple):
+        for item in obj:
+            if _e_tabela(item):
+                return len(item)
+    return None
+
+
+# Mede tempo, linhas de entrada/saída e pico de memória de uma etapa. O pico só é
+# registrado quando a execução rodou sozinha durante a etapa; senão fica vazio
+@contextmanager
+def etapa(nome, linhas_entrada=None):
+    _registros()
+    medir_memoria = _estado.medir_memoria and tracemalloc.is_tracing() and medicao_exclusiva()
+    registro = {
+        "etapa": nome,
+        "nivel": len(_estado.pilha),
+        "linhas_entrada": linhas_entrada,
+        "linhas_saida": None,
+        "tempo_ms": None,
+        "pico_memoria_mb": None,
+    }
+    _estado.registros.append(registro)
+
+    base = 0
+    if medir_memoria:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    # Pico absoluto das etapas internas, que zeram o pico do tracemalloc
+    _estado.pilha.append({"pico_filhos": 0})
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro["tempo_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        frame = _estado.pilha.pop()
+        if medir_memoria and medicao_exclusiva():
+            pico_absoluto = max(tracemalloc.get_traced_memory()[1], frame["pico_filhos"])
+            registro["pico_memoria_mb"] = round(max(pico_absoluto - base, 0) / 1024 ** 2, 2)
+            if _estado.pilha:
+                _estado.pilha[-1]["pico_filhos"] = max(_estado.pilha[-1]["pico_filhos"], pico_absoluto)
+            else:
+                _estado.pico_raiz = max(_estado.pico_raiz, pico_absoluto)
+        logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+
+
+# Decorador para instrumentar funções de limpeza e gráficos
+def medir(nome=None):
+    def decorador(func):
+        nome_etapa = nome or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            linhas_entrada = next((_contar_linhas(a) for a in args if _contar_linhas(a) is not None), None)
+            with etapa(nome_etapa, linhas_entrada) as registro:
+                resultado = func(*args, **kwargs)
+                registro["linhas_saida"] = _contar_linhas(resultado)
+            return resultado
+
+        return wrapper
+
+    return decorador
+
+
+# Tempo de importação de cada módulo carregado sob demanda (módulo -> ms)
+TEMPOS_IMPORTACAO = {}
+
+
+def importar(nome):
+    modulo = sys.modules.get(nome)
+    if modulo is not None:
+        return modulo
+    inicio = time.perf_counter()
+    modulo = importlib.import_module(nome)
+    TEMPOS_IMPORTACAO[nome] = round((time.perf_counter() - inicio) * 1000, 2)
+    logger.info(json.dumps({"etapa": "importacao", "modulo": nome, "tempo_ms": TEMPOS_IMPORTACAO[nome]}))
+    return modulo
+
+
+# Pico de memória da execução atual, somando as etapas que zeraram o pico do tracemalloc.
+# Sem medição exclusiva é o pico do processo (outras sessões e o pré-cálculo incluídos)
+def pico_execucao_mb():
+    _registros()
+    if not (_estado.medir_memoria and tracemalloc.is_tracing()):
+        return None
+    pico = max(tracemalloc.get_traced_memory()[1], _estado.pico_raiz)
+    return round(max(pico - _estado.base_execucao, 0) / 1024 ** 2, 2)
+
+
+# Avisa quando a execução passou do orçamento de memória configurado
+def verificar_orcamento(orcamento_mb=None):
+    orcamento_mb = ORCAMENTO_MEMORIA_MB if orcamento_mb is None else orcamento_mb
+    pico = pico_execucao_mb()
+    if not orcamento_mb or pico is None or pico <= orcamento_mb:
+        return None
+    exclusiva = medicao_exclusiva()
+    if exclusiva:
+        mensagem = f"Execução usou {pico:.1f} MB de pico, acima do orçamento de {orcamento_mb:.0f} MB"
+    else:
+        mensagem = (
+            f"Pico de memória do processo durante a execução ({pico:.1f} MB) passou do orçamento de "
+            f"{orcamento_mb:.0f} MB; inclui outras sessões e o pré-cálculo em segundo plano"
+        )
+    logger.warning(json.dumps({
+        "etapa": "orcamento_memoria", "pico_memoria_mb": pico, "orcamento_mb": orcamento_mb,
+        "escopo": "execucao" if exclusiva else "processo"
+    }))
+    return mensagem
+
+
+# cProfile de uma única execução
+def iniciar_cprofile():
+    perfilador = cProfile.Profile()
+    perfilador.enable()
+    return perfilador
+
+
+def finalizar_cprofile(perfilador, limite=40):
+    perfilador.disable()
+    saida = io.StringIO()
+    pstats.Stats(perfilador, stream=saida).sort_stats("cumulative").print_stats(limite)
+    relatorio = saida.getvalue()
+    logger.info(json.dumps({"etapa": "cprofile", "relatorio": relatorio}, ensure_ascii=False))
+    return relatorio
+
+
+# Painel lateral com o tempo de cada etapa
+def exibir_painel(relatorio_cprofile=None):
+    import pandas as pd
+    import streamlit as st
+
+    with st.sidebar.expander("Perfil de execução", expanded=True):
+        tabela = pd.DataFrame(registros())
+        if tabela.empty:
+            st.write("Nenhuma etapa registrada.")
+        else:
+            tabela["etapa"] = ["  " * n + e for n, e in zip(tabela["nivel"], tabela["etapa"])]
+            st.dataframe(tabela.drop(columns=["nivel"]), hide_index=True)
+        pico = pico_execucao_mb()
+        if pico is not None and medicao_exclusiva():
+            st.write(f"Pico de memória da execução: {pico:.1f} MB")
+        elif pico is not None:
+            st.write(
+                f"Pico de memória do processo: {pico:.1f} MB. Outras sessões ou o pré-cálculo rodaram junto; "
+                "o pico por etapa só é medido com uma execução sozinha."
+            )
+        if TEMPOS_IMPORTACAO:
+            st.write("Importações sob demanda (ms):")
+            st.dataframe(
+                pd.DataFrame(list(TEMPOS_IMPORTACAO.items()), columns=["modulo", "tempo_ms"]),
+                hide_index=True
+            )
+        if relatorio_cprofile:
+            st.text(relatorio_cprofile)
+            st.download_button(
+                label="Baixar cProfile",
+                data=relatorio_cprofile.encode(),
+                file_name="cprofile.txt",
+                mime="text/plain"
+            )
@@ -0,0 +1,293 @@
+# Pré-cálculo em segundo plano dos próximos estados prováveis do painel.
+# Enquanto a página está parada, um pool de threads calcula as posições filtradas,
+# os gastos agregados e os KPIs das outras etapas e dos períodos vizinhos e, em
+# seguida, monta as figuras pedidas na última execução (com os mesmos parâmetros dos
+# widgets); a troca de etapa ou de período vira uma consulta ao cache. As figuras
+# montadas pelo painel também ficam no cache, junto com o estado. Cada nova interação
+# cancela ou interrompe o pré-cálculo de estados que deixaram de ser vizinhos do atual.
+import datetime
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import compactacao
+import graficos
+import limpeza
+import perfil
+
+ETAPAS = list(limpeza.COLUNAS_ETAPA)
+
+# Espaço máximo do cache compartilhado, em MB
+LIMITE_CACHE_MB = float(os.environ.get('CAMPANHAS_CACHE_PRE_CALCULO_MB', 256))
+
+Estado = namedtuple('Estado', [
+    'chave_dados', 'filtros', 'etapa', 'data_inicio', 'data_fim', 'dias_uteis', 'somente_unicos'
+])
+
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='pre_calculo')
+_trava = threading.Lock()
+_cache = OrderedDict()
+_tamanho_cache = [0]
+_estatisticas = {
+    'acertos': 0, 'faltas': 0, 'calculados': 0, 'cancelados': 0, 'figuras_acertos': 0, 'figuras_faltas': 0,
+}
+
+
+def _perdas_por_motivo(df_filtrado, df_gasto):
+    tabela = graficos.tabela_perdas_por_motivo(df_filtrado)
+    return graficos.perdas_por_motivo(df_filtrado, perdas=tabela), tabela
+
+
+# Figuras que dependem só do recorte do estado e dos parâmetros dos widgets:
+# nome -> função (df_filtrado, df_gasto, *parâmetros) que devolve a figura (ou a figura e a tabela)
+FIGURAS = {
+    'grafico_gasto_convenio_produto': graficos.grafico_gasto_convenio_produto,
+    'leads_por_origem': graficos.leads_por_origem,
+    'funil_de_etapas': graficos.funil_de_etapas,
+    'cohort_dinamico': lambda df, gasto, evento: graficos.cohort_dinamico(df, gasto, evento_escolhido=evento),
+    'cpl_convenios_produto': graficos.cpl_convenios_produto,
+    'roi_por_convenio_produto': graficos.roi_por_convenio_produto,
+    'quantidade_leads_por_convenio': graficos.quantidade_leads_por_convenio,
+    'gasto_vs_comissao_por_canal': graficos.gasto_vs_comissao_por_canal,
+    'roi_por_canal': graficos.roi_por_canal,
+    'perdas_por_etapa': lambda df, gasto: graficos.perdas_por_etapa(df),
+    'perdas_por_motivo': _perdas_por_motivo,
+    'grafico_leads_por_10k': graficos.grafico_leads_por_10k,
+    'heatmap_horario_leads': lambda df, gasto, origens: graficos.heatmap_horario_leads(df, list(origens)),
+}
+# Gráficos com drill-down: mantêm o customdata na compactação
+FIGURAS_DRILL = {'grafico_gasto_convenio_produto', 'quantidade_leads_por_convenio', 'roi_por_canal'}
+
+
+class Cancelado(Exception):
+    pass
+
+
+# Chave do cache: os valores dos filtros viram texto para que NaN seja comparável
+def chave_estado(estado):
+    filtros = tuple((nome, tuple(str(v) for v in valores)) for nome, valores in estado.filtros)
+    return estado._replace(filtros=filtros)
+
+
+def novo_estado(chave_dados, filtros, etapa, data_inicio, data_fim, dias_uteis, somente_unicos):
+    filtros = tuple((nome, tuple(valores)) for nome, valores in filtros.items())
+    return Estado(chave_dados, filtros, etapa, data_inicio, data_fim, dias_uteis, somente_unicos)
+
+
+# Outras etapas e os períodos anterior e seguinte de mesmo tamanho
+def vizinhos(estado):
+    duracao = estado.data_fim - estado.data_inicio + datetime.timedelta(days=1)
+    estados = [estado._replace(etapa=etapa) for etapa in ETAPAS if etapa != estado.etapa]
+    estados.append(estado._replace(data_inicio=estado.data_inicio - duracao, data_fim=estado.data_fim - duracao))
+    estados.append(estado._replace(data_inicio=estado.data_inicio + duracao, data_fim=estado.data_fim + duracao))
+    return estados
+
+
+def calcular_estado(df, df_gasto, estado, continuar=lambda: True):
+    filtros = dict(estado.filtros)
+    linhas = limpeza.selecionar_linhas(
+        df, filtros, estado.etapa, estado.data_inicio, estado.data_fim, estado.dias_uteis, estado.somente_unicos
+    )
+    if not continuar():
+        raise Cancelado()
+    linhas_gasto = limpeza.selecionar_linhas_gasto(df_gasto, filtros, estado.data_inicio, estado.data_fim, estado.dias_uteis)
+    gastos = limpeza.calcular_gastos(df_gasto.iloc[linhas_gasto])
+    if not continuar():
+        raise Cancelado()
+
+    kpis = calcular_kpis(df, linhas, gastos, estado)
+    return {'linhas': linhas, 'linhas_gasto': linhas_gasto, 'gastos': gastos, 'kpis': kpis, 'figuras': {}}
+
+
+# KPIs só precisam da etapa e da comissão: evita materializar o recorte inteiro.
+# Os dias úteis seguem os convênios do filtro (ou os do drill-down, quando informados)
+def calcular_kpis(df, linhas, gastos, estado, convenios=None):
+    base = df[['etapa']]
+    if estado.somente_unicos and 'duplicado' in df:
+        base = base[~df['duplicado'].to_numpy()]
+    convenios = dict(estado.filtros)['convenio_acronimo'] if convenios is None else convenios
+    return graficos.calcular_kpis(
+        base, df[['etapa', 'comissao_paga']].iloc[linhas], gastos,
+        estado.data_inicio, estado.data_fim, estado.dias_uteis, convenios
+    )
+
+
+def _tamanho(resultado):
+    return (
+        resultado['linhas'].nbytes + resultado['linhas_gasto'].nbytes + int(resultado['gastos'].memory_usage().sum())
+        + sum(tamanho for _, tamanho in resultado['figuras'].values())
+    )
+
+
+def _liberar_espaco(limite):
+    while _tamanho_cache[0] > limite and _cache:
+        _, (_, removido) = _cache.popitem(last=False)
+        _tamanho_cache[0] -= removido
+
+
+# Guarda o estado e devolve o resultado que ficou no cache (o já existente, se houver)
+def _guardar(chave, resultado):
+    tamanho = _tamanho(resultado)
+    limite = LIMITE_CACHE_MB * 1024 ** 2
+    with _trava:
+        if chave in _cache:
+            return _cache[chave][0]
+        if tamanho > limite:
+            return resultado
+        _cache[chave] = (resultado, tamanho)
+        _tamanho_cache[0] += tamanho
+        _liberar_espaco(limite)
+        return resultado
+
+
+# Saída de construir() com a figura já compactada (o gráfico do painel a exibe sem alterá-la)
+def montar_figura(nome, construir):
+    saida = construir()
+    fig = saida[0] if isinstance(saida, tuple) else saida
+    compactacao.compactar(fig, manter_customdata=nome in FIGURAS_DRILL)
+    return saida
+
+
+# Figura compactada e o seu tamanho aproximado (o JSON enviado ao navegador)
+def _montar_figura(nome, construir):
+    saida = montar_figura(nome, construir)
+    fig = saida[0] if isinstance(saida, tuple) else saida
+    return saida, int(compactacao.tamanho_kb(fig) * 1024)
+
+
+# Acrescenta uma figura ao resultado de um estado, contando o espaço se ele está no cache
+def _acrescentar_figura(chave, resultado, chave_figura, saida, tamanho):
+    with _trava:
+        if chave_figura in resultado['figuras']:
+            return resultado['figuras'][chave_figura][0]
+        resultado['figuras'][chave_figura] = (saida, tamanho)
+        item = _cache.get(chave)
+        if item is not None and item[0] is resultado:
+            _cache[chave] = (resultado, item[1] + tamanho)
+            _tamanho_cache[0] += tamanho
+            _liberar_espaco(LIMITE_CACHE_MB * 1024 ** 2)
+        return saida
+
+
+# Figura do estado, já compactada: do cache quando já foi montada (em segundo plano ou
+# por outra sessão), senão montada agora por construir() e guardada com o estado
+def figura(estado, resultado, nome, parametros, construir):
+    chave_figura = (nome, tuple(parametros))
+    with _trava:
+        item = resultado['figuras'].get(chave_figura)
+        _estatisticas['figuras_acertos' if item is not None else 'figuras_faltas'] += 1
+    if item is not None:
+        return item[0]
+    saida, tamanho = _montar_figura(nome, construir)
+    return _acrescentar_figura(chave_estado(estado), resultado, chave_figura, saida, tamanho)
+
+
+# Monta sobre o recorte do estado as figuras pedidas na última execução do painel
+def montar_figuras(df, df_gasto, estado, resultado, figuras, continuar=lambda: True):
+    chave = chave_estado(estado)
+    df_filtrado = df_gasto_filtrado = None
+    for nome, parametros in figuras:
+        if not continuar():
+            return
+        if (nome, parametros) in resultado['figuras']:
+            continue
+        if df_filtrado is None:
+            df_filtrado = df.iloc[resultado['linhas']]
+            df_gasto_filtrado = df_gasto.iloc[resultado['linhas_gasto']]
+        saida, tamanho = _montar_figura(
+            nome, lambda: FIGURAS[nome](df_filtrado, df_gasto_filtrado, *parametros)
+        )
+        _acrescentar_figura(chave, resultado, (nome, parametros), saida, tamanho)
+
+
+def _consultar(chave):
+    with _trava:
+        item = _cache.get(chave)
+        if item is None:
+            return None
+        _cache.move_to_end(chave)
+        return item[0]
+
+
+def estatisticas():
+    with _trava:
+        consultas = _estatisticas['acertos'] + _estatisticas['faltas']
+        return {
+            **_estatisticas,
+            'taxa_acerto': round(_estatisticas['acertos'] / consultas, 3) if consultas else None,
+            'estados_em_cache': len(_cache),
+            'cache_mb': round(_tamanho_cache[0] / 1024 ** 2, 2),
+        }
+
+
+# Um por sessão: guarda as tarefas agendadas de cada estado
+class PreCalculador:
+    def __init__(self):
+        self._tarefas = {}
+        self._aguardado = None
+
+    # Nova interação: cancela o pré-cálculo que deixou de ser útil (mantém o estado
+    # pedido agora e os seus vizinhos, que continuam sendo os próximos prováveis)
+    def nova_execucao(self, estado_atual):
+        uteis = {chave_estado(e) for e in [estado_atual] + vizinhos(estado_atual)}
+        for chave, tarefa in list(self._tarefas.items()):
+            if chave not in uteis and tarefa.cancel():
+                with _trava:
+                    _estatisticas['cancelados'] += 1
+        self._tarefas = {c: t for c, t in self._tarefas.items() if c in uteis and not t.done()}
+
+    def obter(self, df, df_gasto, estado):
+        chave = chave_estado(estado)
+        resultado = _consultar(chave)
+        # O estado pedido sai da lista: se as figuras dele ainda estão sendo montadas em
+        # segundo plano, a montagem para e o painel monta as que faltarem
+        self._aguardado = chave
+        tarefa = self._tarefas.pop(chave, None)
+        if resultado is None and tarefa is not None:
+            # Já está sendo calculado em segundo plano: espera o estado em vez de recalcular
+            try:
+                resultado = tarefa.result()
+            except Exception:
+                resultado = None
+        self._aguardado = None
+
+        with _trava:
+            _estatisticas['acertos' if resultado is not None else 'faltas'] += 1
+        if resultado is None:
+            resultado = _guardar(chave, calcular_estado(df, df_gasto, estado))
+        return resultado
+
+    # figuras: (nome, parâmetros) das figuras exibidas nesta execução, montadas também nos vizinhos
+    def agendar_vizinhos(self, df, df_gasto, estado, figuras=()):
+        for vizinho in vizinhos(estado):
+            chave = chave_estado(vizinho)
+            if chave in self._tarefas:
+                continue
+            resultado = _consultar(chave)
+            if resultado is not None and all((nome, p) in resultado['figuras'] for nome, p in figuras):
+                continue
+            self._tarefas[chave] = _pool.submit(self._calcular, df, df_gasto, vizinho, chave, list(figuras))
+
+    def _calcular(self, df, df_gasto, estado, chave, figuras):
+        # Os registros de perfil das threads do pool não pertencem a nenhuma execução
+        perfil.limpar_registros()
+        # Interrompe entre as etapas se a tarefa saiu da lista (nova interação); o estado
+        # que o painel está esperando termina, mas sem as figuras
+        continuar = lambda: chave in self._tarefas
+        try:
+            with perfil.segundo_plano():
+                resultado = _consultar(chave)
+                if resultado is None:
+                    resultado = _guardar(chave, calcular_estado(
+                        df, df_gasto, estado, lambda: continuar() or chave == self._aguardado
+                    ))
+                    with _trava:
+                        _estatisticas['calculados'] += 1
+                # O estado já fica disponível; as figuras entram no resultado uma a uma
+                montar_figuras(df, df_gasto, estado, resultado, figuras, continuar)
+        except Cancelado:
+            with _trava:
+                _estatisticas['cancelados'] += 1
+            raise
+        return resultado
@@ -0,0 +1,122 @@
+# Ranking de vendedores em janelas móveis (7/30/90 dias).
+# Os leads viram agregados por vendedor e dia de criação, guardados em ordem de dia;
+# cada janela é uma fatia contígua (searchsorted), então o custo do ranking depende
+# do tamanho da janela e não do histórico. Os agregados são montados uma vez por
+# DataFrame compartilhado. As dimensões dos filtros do painel ficam na chave dos agregados, e o recorte pelos
+# filtros é feito só sobre a fatia da janela.
+import numpy as np
+import pandas as pd
+
+import calendario
+import dados_compartilhados
+from perfil import medir
+
+JANELAS = (7, 30, 90)
+
+# Dimensões dos filtros do painel (equipe, produto, convênio e canal)
+DIMENSOES = ['equipe', 'produto', 'convenio_acronimo', 'origem']
+
+
+# Leads, pagos e comissão por vendedor e dia, e a distribuição de dias até o pagamento
+def _agregar(df, coluna, somente_unicos=False):
+    if somente_unicos and 'duplicado' in df:
+        df = df[~df['duplicado'].to_numpy()]
+    pago = (df['etapa'] == 'PAGO').to_numpy()
+    dia = df['dia_num'].to_numpy()
+    dia_pago = calendario.numero_dia(df['data_pago'])
+    vendedor = df[coluna].fillna('Sem vendedor').to_numpy()
+    valido = dia != calendario.DIA_INVALIDO
+
+    dimensoes = {nome: df[nome].to_numpy() for nome in DIMENSOES}
+
+    diario = pd.DataFrame({
+        'dia_num': dia[valido],
+        'vendedor': vendedor[valido],
+        **{nome: valores[valido] for nome, valores in dimensoes.items()},
+        'leads': 1,
+        'pagos': pago[valido].astype('int64'),
+        'comissao': np.where(pago, df['comissao_paga'].fillna(0).to_numpy(), 0.0)[valido],
+    }).groupby(['dia_num', 'vendedor', *DIMENSOES], dropna=False, as_index=False)[['leads', 'pagos', 'comissao']].sum()
+
+    com_pagamento = pago & valido & (dia_pago != calendario.DIA_INVALIDO)
+    dias_pago = pd.DataFrame({
+        'dia_num': dia[com_pagamento],
+        'vendedor': vendedor[com_pagamento],
+        **{nome: valores[com_pagamento] for nome, valores in dimensoes.items()},
+        'dias_ate_pago': (dia_pago - dia)[com_pagamento],
+    }).groupby(['dia_num', 'vendedor', *DIMENSOES, 'dias_ate_pago'], dropna=False).size().reset_index(name='quantidade')
+    return diario, dias_pago
+
+
+# Fatia da janela, recortada pelos filtros das dimensões (mesmo isin do filtro de linhas)
+def _fatia(tabela, inicio, fim, filtros=None):
+    dias = tabela['dia_num'].to_numpy()
+    fatia = tabela.iloc[np.searchsorted(dias, inicio, 'left'):np.searchsorted(dias, fim, 'right')]
+    if not filtros:
+        return fatia
+    mascara = np.ones(len(fatia), dtype=bool)
+    for coluna in DIMENSOES:
+        if coluna in filtros:
+            mascara &= fatia[coluna].isin(filtros[coluna]).to_numpy()
+    return fatia.iloc[np.flatnonzero(mascara)]
+
+
+# Mediana exata a partir de (vendedor, valor, quantidade), sem expandir as linhas
+def _mediana_ponderada(tabela):
+    if tabela.empty:
+        return pd.Series(dtype='float64')
+    ordenada = tabela.groupby(['vendedor', 'dias_ate_pago'])['quantidade'].sum().reset_index()
+    acumulado = ordenada['quantidade'].cumsum().to_numpy()
+    totais = ordenada.groupby('vendedor')['quantidade'].sum()
+    inicio = np.concatenate([[0], totais.cumsum().to_numpy()[:-1]])
+    n = totais.to_numpy()
+    valores = ordenada['dias_ate_pago'].to_numpy()
+    # Posições (1 a n) dos elementos centrais; com n par, média dos dois
+    baixo = valores[np.searchsorted(acumulado, inicio + (n + 1) // 2, 'left')]
+    alto = valores[np.searchsorted(acumulado, inicio + n // 2 + 1, 'left')]
+    return pd.Series((baixo + alto) / 2, index=totais.index)
+
+
+# Agregados somente leitura; o groupby ordena pelas chaves, que começam pelo dia, então
+# as tabelas já saem em ordem de dia
+class AgregadosVendedores:
+    def __init__(self, df, coluna='vendedor2', somente_unicos=False):
+        self.coluna = coluna
+        self.somente_unicos = somente_unicos
+        self.diario, self.dias_pago = _agregar(df, coluna, somente_unicos)
+
+    def janela(self, fim, dias, filtros=None):
+        fim = int(calendario.numero_dia([fim])[0])
+        inicio = fim - dias + 1
+        diario = _fatia(self.diario, inicio, fim, filtros)
+        dias_pago = _fatia(self.dias_pago, inicio, fim, filtros)
+        resumo = diario.groupby('vendedor')[['leads', 'pagos', 'comissao']].sum()
+        resumo['conversao'] = (resumo['pagos'] / resumo['leads'] * 100).round(2)
+        resumo['mediana_dias_pago'] = _mediana_ponderada(dias_pago)
+        return resumo
+
+
+# Um conjunto de agregados por DataFrame compartilhado, coluna de vendedor e deduplicação
+def agregados(df, coluna='vendedor2', somente_unicos=False):
+    return dados_compartilhados.derivado(
+        df, ('agregados_vendedores', coluna, somente_unicos),
+        lambda df: AgregadosVendedores(df, coluna, somente_unicos)
+    )
+
+
+# Tabela larga com as métricas de cada janela, ordenada pela comissão da janela escolhida;
+# filtros (dimensão -> valores aceitos) recortam os leads como no restante do painel
+@medir()
+def ranking_vendedores(df, data_fim, coluna='vendedor2', janelas=JANELAS, ordenar_por=30, somente_unicos=False,
+                       filtros=None):
+    base = agregados(df, coluna, somente_unicos)
+    partes = []
+    for dias in janelas:
+        resumo = base.janela(data_fim, dias, filtros)
+        partes.append(resumo.add_suffix(f'_{dias}d'))
+    ranking = pd.concat(partes, axis=1)
+    # Vendedor sem leads em uma janela fica com zero (conversão e mediana continuam vazias)
+    contagens = [c for c in ranking.columns if c.startswith(('leads', 'pagos', 'comissao'))]
+    ranking[contagens] = ranking[contagens].fillna(0)
+    ranking = ranking.sort_values(f'comissao_{ordenar_por}d', ascending=False)
+    return ranking.rename_axis('vendedor').reset_index()
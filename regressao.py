@@ -0,0 +1,301 @@
+# Regressão de saídas (golden outputs) do preparo de dados dos gráficos.
+# Roda limpeza, filtros e cada função de gráfico sobre exportações sintéticas fixas e
+# compara as tabelas resultantes (e os dados dos traces de cada figura) com as saídas
+# salvas, dentro de uma tolerância numérica. Tempo, pico de memória e blocos alocados
+# ficam registrados junto das saídas, para confirmar que uma versão otimizada dá os
+# mesmos números e é mais rápida.
+#
+# A referência (regressao_golden.json) é versionada. Cada caso guarda o commit em que
+# foi gerado: os gráficos que já existiam vêm da versão anterior às otimizações
+# (bb18d32), e os recursos novos, do commit que os criou ou mudou de propósito.
+#
+#   python regressao.py                                     # compara com a referência
+#   python regressao.py --salvar --casos X --referencia C   # regrava só os casos X
+import argparse
+import io
+import json
+import logging
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+import atribuicao
+import benchmark
+import dados_sinteticos
+import graficos
+import limpeza
+import ranking_vendedores
+import simulador
+
+# Exportações sintéticas fixas: nome -> parâmetros do gerador
+DATASETS = {
+    'trimestre': {'linhas': 20_000, 'dias': 90, 'envios_por_dia': 60, 'seed': 7},
+    'historico_longo': {'linhas': 20_000, 'dias': 730, 'envios_por_dia': 20, 'seed': 11},
+}
+
+ARQUIVO_PADRAO = 'regressao_golden.json'
+
+# Atributos dos traces comparados nas figuras
+ATRIBUTOS_TRACE = ('x', 'y', 'z', 'text', 'customdata')
+
+
+# Casos além dos gráficos do benchmark: nome -> função que recebe o contexto do dataset
+CASOS_EXTRAS = {
+    'calcular_kpis': lambda c: graficos.calcular_kpis(
+        c['df'], c['df_filtrado'], c['gastos'], c['data_inicio'], c['data_fim'], False
+    ),
+    'calcular_kpis_dias_uteis': lambda c: graficos.calcular_kpis(
+        c['df'], c['df_filtrado'], c['gastos'], c['data_inicio'], c['data_fim'], True,
+        c['filtros']['convenio_acronimo']
+    ),
+    'calcular_gastos': lambda c: limpeza.calcular_gastos(c['gasto_filtrado']),
+    'tabela_perdas_por_motivo': lambda c: graficos.tabela_perdas_por_motivo(c['df_filtrado']),
+    **{
+        f'cohort_{evento.lower()}': (lambda c, coluna=coluna: graficos.calcular_metricas_cohort(
+            *graficos.calcular_cohort(c['df_filtrado'], coluna)
+        ))
+        for evento, coluna in {
+            'Pagamento': 'data_pago', 'Perda': 'data_perda',
+            'Negociacao': 'data_negociacao', 'Contratacao': 'data_contratacao',
+        }.items()
+    },
+    'ranking_vendedores': lambda c: ranking_vendedores.ranking_vendedores(c['df'], c['data_fim']),
+    'ranking_vendedores_filtrado': lambda c: ranking_vendedores.ranking_vendedores(
+        c['df'], c['data_fim'], filtros={'equipe': sorted(c['filtros']['equipe'], key=str)[:2]}
+    ),
+    'atribuir_leads': lambda c: atribuicao.atribuir_leads(c['df_filtrado'], c['gasto_filtrado']),
+    'estatisticas_historicas': lambda c: simulador.estatisticas_historicas(c['df_filtrado'], c['gasto_filtrado']),
+}
+
+
+def _casos():
+    casos = {
+        nome: (lambda c, funcao=funcao: funcao(c['df_filtrado'], c['gasto_filtrado']))
+        for nome, funcao in benchmark.GRAFICOS.items()
+    }
+    casos.update(CASOS_EXTRAS)
+    return casos
+
+
+# Dados tratados e filtrados (todas as opções, etapa Lead, período inteiro) de um dataset
+def preparar(linhas, dias, envios_por_dia, seed):
+    bruto = pd.read_csv(io.StringIO(dados_sinteticos.gerar_hubspot(linhas, dias=dias, seed=seed).to_csv(index=False)))
+    bruto_gasto = pd.read_csv(io.StringIO(dados_sinteticos.gerar_gasto(envios_por_dia, dias=dias, seed=seed).to_csv(index=False)))
+    df = limpeza.tratar_arquivo_hubspot(bruto)
+    df_gasto = limpeza.tratar_arquivo_pagos(bruto_gasto)
+
+    filtros = {
+        'equipe': list(df['equipe'].unique()),
+        'produto': list(df['produto'].unique()),
+        'convenio_acronimo': list(df['convenio_acronimo'].unique()),
+        'origem': list(df['origem'].unique())
+    }
+    data_inicio, data_fim = df['data'].min(), df['data'].max()
+    df_filtrado, gasto_filtrado = limpeza.aplicar_filtros(df, df_gasto, filtros, 'Lead', data_inicio, data_fim)
+    return {
+        'df': df, 'df_gasto': df_gasto, 'df_filtrado': df_filtrado, 'gasto_filtrado': gasto_filtrado,
+        'gastos': limpeza.calcular_gastos(gasto_filtrado), 'data_inicio': data_inicio, 'data_fim': data_fim,
+        'filtros': filtros,
+    }
+
+
+def _valor(v):
+    if isinstance(v, (bool, np.bool_)):
+        return int(v)
+    if isinstance(v, (int, np.integer)):
+        return int(v)
+    if isinstance(v, (float, np.floating)):
+        return None if math.isnan(v) else float(v)
+    return None if v is None or v is pd.NaT or v is pd.NA else str(v)
+
+
+def _tabela(dados):
+    dados = pd.DataFrame(dados)
+    return {
+        'colunas': [str(c) for c in dados.columns],
+        'linhas': [[_valor(v) for v in linha] for linha in dados.itertuples(index=False, name=None)],
+    }
+
+
+# Saída de um caso -> tabelas serializáveis (nome -> colunas e linhas)
+def tabelas(saida, prefixo=''):
+    if isinstance(saida, go.Figure):
+        resultado = {}
+        for i, trace in enumerate(saida.data):
+            for atributo in ATRIBUTOS_TRACE:
+                valores = trace[atributo] if atributo in trace else None
+                if valores is None:
+                    continue
+                array = np.asarray(valores, dtype=object)
+                if array.ndim == 1:
+                    array = array[:, None]
+                resultado[f'{prefixo}trace{i}.{atributo}'] = _tabela(array)
+        return resultado
+    if isinstance(saida, (tuple, list)):
+        resultado = {}
+        for i, parte in enumerate(saida):
+            resultado.update(tabelas(parte, f'{prefixo}{i}.'))
+        return resultado
+    if isinstance(saida, pd.Series):
+        return {prefixo or 'tabela': _tabela(saida.reset_index())}
+    if isinstance(saida, pd.DataFrame):
+        return {prefixo or 'tabela': _tabela(saida.reset_index(drop=isinstance(saida.index, pd.RangeIndex)))}
+    if isinstance(saida, dict):
+        return {prefixo or 'tabela': _tabela([saida])}
+    return {prefixo or 'valor': _tabela([[saida]])}
+
+
+# Tempo (melhor de N), e numa execução extra com tracemalloc o pico de memória e os
+# blocos alocados pela chamada que continuam vivos ao final (saída e caches)
+def medir(funcao, contexto, repeticoes):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        saida = funcao(contexto)
+        tempo = (time.perf_counter() - inicio) * 1000
+        melhor = tempo if melhor is None else min(melhor, tempo)
+
+    tracemalloc.start()
+    antes = tracemalloc.take_snapshot()
+    funcao(contexto)
+    depois = tracemalloc.take_snapshot()
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    blocos = sum(max(e.count_diff, 0) for e in depois.compare_to(antes, 'filename'))
+    return saida, {'tempo_ms': round(melhor, 2), 'pico_memoria_mb': round(pico / 1024 ** 2, 2), 'blocos_alocados': blocos}
+
+
+def executar(datasets=DATASETS, casos=None, repeticoes=3):
+    todos = _casos()
+    resultados = {}
+    for nome_dataset, parametros in datasets.items():
+        contexto = preparar(**parametros)
+        resultados[nome_dataset] = {}
+        for nome in casos or todos:
+            saida, medidas = medir(todos[nome], contexto, repeticoes)
+            resultados[nome_dataset][nome] = {'tabelas': tabelas(saida), **medidas}
+    return resultados
+
+
+def _coluna(linhas, i):
+    return pd.Series([linha[i] for linha in linhas], dtype=object)
+
+
+# Diferenças entre duas tabelas serializadas; números comparados com tolerância
+def diferencas_tabela(esperada, obtida, rtol, atol):
+    if esperada['colunas'] != obtida['colunas']:
+        return [f"colunas {esperada['colunas']} -> {obtida['colunas']}"]
+    if len(esperada['linhas']) != len(obtida['linhas']):
+        return [f"{len(esperada['linhas'])} linhas -> {len(obtida['linhas'])}"]
+    diferencas = []
+    for i, coluna in enumerate(esperada['colunas']):
+        a, b = _coluna(esperada['linhas'], i), _coluna(obtida['linhas'], i)
+        na, nb = pd.to_numeric(a, errors='coerce'), pd.to_numeric(b, errors='coerce')
+        numericos = (na.notna() & nb.notna()).to_numpy()
+        proximos = np.isclose(na[numericos].astype(float), nb[numericos].astype(float), rtol=rtol, atol=atol)
+        textos = a[~numericos].to_numpy() == b[~numericos].to_numpy()
+        divergentes = int((~proximos).sum() + (~textos).sum())
+        if divergentes:
+            diferencas.append(f'coluna {coluna}: {divergentes} valores divergentes')
+    return diferencas
+
+
+def comparar(resultados, referencia, rtol=1e-6, atol=1e-9):
+    divergencias = []
+    for nome_dataset, casos in resultados.items():
+        for nome, caso in casos.items():
+            esperado = referencia.get(nome_dataset, {}).get(nome)
+            if esperado is None:
+                divergencias.append((nome_dataset, nome, '-', 'caso sem saída de referência'))
+                continue
+            for tabela in sorted(set(esperado['tabelas']) | set(caso['tabelas'])):
+                if tabela not in caso['tabelas'] or tabela not in esperado['tabelas']:
+                    divergencias.append((nome_dataset, nome, tabela, 'tabela ausente em um dos lados'))
+                    continue
+                for diferenca in diferencas_tabela(esperado['tabelas'][tabela], caso['tabelas'][tabela], rtol, atol):
+                    divergencias.append((nome_dataset, nome, tabela, diferenca))
+    return divergencias
+
+
+# Um caso por linha, para a referência versionada ter diffs legíveis
+def gravar(registro, caminho):
+    partes = [
+        f'{json.dumps(chave)}: {json.dumps(valor, ensure_ascii=False)}'
+        for chave, valor in registro.items() if chave != 'resultados'
+    ]
+    datasets = []
+    for nome_dataset, casos in registro['resultados'].items():
+        linhas = ',\n'.join(f'  {json.dumps(nome)}: {json.dumps(caso, ensure_ascii=False)}' for nome, caso in casos.items())
+        datasets.append(f' {json.dumps(nome_dataset)}: {{\n{linhas}\n }}')
+    partes.append('"resultados": {\n' + ',\n'.join(datasets) + '\n}')
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        arquivo.write('{' + ',\n'.join(partes) + '}\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Regressão das saídas dos gráficos do painel de campanhas.')
+    parser.add_argument('--arquivo', default=ARQUIVO_PADRAO)
+    parser.add_argument('--salvar', action='store_true', help='Grava as saídas atuais dos casos indicados como referência')
+    parser.add_argument('--referencia', help='Commit de onde vêm as saídas gravadas com --salvar')
+    parser.add_argument('--casos', nargs='+', help='Roda só os casos indicados')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--rtol', type=float, default=1e-6)
+    parser.add_argument('--atol', type=float, default=1e-9)
+    args = parser.parse_args(argv)
+
+    # Os gráficos chamam o Streamlit fora do servidor; silencia os avisos
+    for nome in list(logging.root.manager.loggerDict):
+        if nome.startswith('streamlit'):
+            logging.getLogger(nome).setLevel(logging.ERROR)
+
+    # Regravar a referência é explícito: só os casos pedidos, com o commit de origem
+    if args.salvar and not (args.casos and args.referencia):
+        print('--salvar exige --casos e --referencia.')
+        return 2
+
+    try:
+        with open(args.arquivo, encoding='utf-8') as arquivo:
+            registro = json.load(arquivo)
+    except FileNotFoundError:
+        print(f'Referência {args.arquivo} não encontrada.')
+        return 1
+    referencia = registro['resultados']
+
+    resultados = executar(casos=args.casos, repeticoes=args.repeticoes)
+
+    if args.salvar:
+        for nome_dataset, casos in resultados.items():
+            for nome, caso in casos.items():
+                referencia.setdefault(nome_dataset, {})[nome] = {
+                    'referencia': args.referencia,
+                    'data': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'pandas': pd.__version__,
+                    **caso,
+                }
+        gravar(registro, args.arquivo)
+        print(f'Referência de {len(args.casos)} casos gravada em {args.arquivo}.')
+        return 0
+
+    for nome_dataset, casos in resultados.items():
+        for nome, caso in casos.items():
+            antes = referencia.get(nome_dataset, {}).get(nome)
+            comparativo = f"{antes['tempo_ms'] / caso['tempo_ms']:>6.2f}x" if antes and caso['tempo_ms'] else '      -'
+            print(f"{nome_dataset:<16} {nome:<32} {caso['tempo_ms']:>9.1f} ms {comparativo} "
+                  f"{caso['pico_memoria_mb']:>8.2f} MB {caso['blocos_alocados']:>8} blocos")
+
+    divergencias = comparar(resultados, referencia, args.rtol, args.atol)
+    for nome_dataset, nome, tabela, diferenca in divergencias:
+        print(f'DIVERGÊNCIA {nome_dataset} {nome} {tabela}: {diferenca}')
+    return 1 if divergencias else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
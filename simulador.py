@@ -0,0 +1,112 @@
+# Simulador de alocação de orçamento entre convênio/produto/canal.
+# Avalia milhares de divisões do orçamento de uma vez com operações de matriz do NumPy,
+# sorteando as taxas históricas (Monte Carlo) para obter faixas de incerteza.
+import numpy as np
+import pandas as pd
+
+from limpeza import CUSTOS_UNITARIOS
+from perfil import medir
+
+CHAVES = ['convenio_acronimo', 'produto', 'origem']
+
+
+# Disparos, leads, pagos e comissão históricos por segmento
+@medir()
+def estatisticas_historicas(df_filtrado, df_gasto, custos=None, max_segmentos=200):
+    custos = custos or CUSTOS_UNITARIOS
+    disparos = (
+        df_gasto.groupby(['Convênio', 'Produto', 'Canal'])['Quantidade'].sum()
+        .rename_axis(CHAVES).rename('disparos')
+    )
+    pago = df_filtrado['etapa'] == 'PAGO'
+    historico = pd.DataFrame({
+        'leads': df_filtrado.groupby(CHAVES).size(),
+        'pagos': pago.groupby([df_filtrado[c] for c in CHAVES]).sum(),
+        'comissao': df_filtrado['comissao_paga'].where(pago).groupby([df_filtrado[c] for c in CHAVES]).sum(),
+    })
+    historico = pd.concat([disparos, historico], axis=1, join='inner').fillna(0).reset_index()
+
+    historico['custo_unitario'] = historico['origem'].map(custos)
+    historico = historico[(historico['disparos'] > 0) & historico['custo_unitario'].notna()]
+    historico = historico.nlargest(max_segmentos, 'disparos').reset_index(drop=True)
+
+    historico['leads_por_10k'] = historico['leads'] / historico['disparos'] * 10_000
+    historico['conversao'] = historico['pagos'] / historico['leads'].where(historico['leads'] > 0)
+    historico['comissao_media'] = historico['comissao'] / historico['pagos'].where(historico['pagos'] > 0)
+    return historico
+
+
+# Sorteia taxas por segmento: Beta para leads/disparo e pago/lead, Gamma para a comissão média
+def _sortear_taxas(historico, amostras, rng):
+    disparos = historico['disparos'].to_numpy(float)
+    leads = historico['leads'].to_numpy(float)
+    pagos = historico['pagos'].to_numpy(float)
+    comissao = historico['comissao'].to_numpy(float)
+
+    taxa_lead = rng.beta(leads + 1, np.maximum(disparos - leads, 0) + 1, size=(amostras, len(historico)))
+    taxa_pago = rng.beta(pagos + 1, np.maximum(leads - pagos, 0) + 1, size=(amostras, len(historico)))
+
+    # Comissão média com prior fraco na média geral, para segmentos com poucos pagos
+    media_geral = comissao.sum() / max(pagos.sum(), 1)
+    forma = pagos + 1
+    escala = (comissao + media_geral) / forma ** 2
+    comissao_media = rng.gamma(forma, escala, size=(amostras, len(historico)))
+    return taxa_lead * taxa_pago * comissao_media
+
+
+def _candidatos(quantidade, segmentos, rng, centro=None, concentracao=1.0):
+    if centro is None:
+        return rng.dirichlet(np.full(segmentos, concentracao), size=quantidade)
+    return rng.dirichlet(centro * concentracao + 1e-3, size=quantidade)
+
+
+@medir()
+def simular_alocacao(historico, orcamento, candidatos=5_000, amostras=500, rodadas=3,
+                     fator_saturacao=2.0, quantil_risco=None, seed=0):
+    rng = np.random.default_rng(seed)
+    segmentos = len(historico)
+    custo = historico['custo_unitario'].to_numpy(float)
+
+    # Resposta com saturação: a base de cada segmento esgota à medida que os disparos
+    # passam do volume histórico (fator_saturacao controla a capacidade)
+    capacidade = historico['disparos'].to_numpy(float) * fator_saturacao
+    receita_por_disparo = _sortear_taxas(historico, amostras, rng)       # (amostras, segmentos)
+    receita_capacidade = receita_por_disparo * capacidade                  # (amostras, segmentos)
+
+    def avaliar(divisoes):
+        disparos = divisoes * orcamento / custo                            # (candidatos, segmentos)
+        alcance = 1 - np.exp(-disparos / capacidade)
+        lucro = alcance @ receita_capacidade.T - orcamento                 # (candidatos, amostras)
+        criterio = lucro.mean(axis=1) if quantil_risco is None else np.quantile(lucro, quantil_risco, axis=1)
+        return lucro, criterio
+
+    melhor_divisao, melhor_lucro, melhor_criterio = None, None, -np.inf
+    for rodada in range(rodadas):
+        # Primeira rodada explora o simplex; as seguintes refinam em torno do melhor candidato
+        centro = None if rodada == 0 else melhor_divisao
+        divisoes = _candidatos(candidatos, segmentos, rng, centro, concentracao=1.0 if centro is None else 50.0 * 4 ** rodada)
+        if melhor_divisao is not None:
+            divisoes[0] = melhor_divisao
+        lucro, criterio = avaliar(divisoes)
+        i = int(np.argmax(criterio))
+        if criterio[i] > melhor_criterio:
+            melhor_divisao, melhor_lucro, melhor_criterio = divisoes[i], lucro[i], criterio[i]
+
+    alocacao = historico[CHAVES + ['custo_unitario', 'leads_por_10k', 'conversao', 'comissao_media']].copy()
+    alocacao['participacao'] = melhor_divisao
+    alocacao['orcamento'] = (melhor_divisao * orcamento).round(2)
+    alocacao['disparos'] = (alocacao['orcamento'] / custo).round(0)
+    alcance = capacidade * (1 - np.exp(-alocacao['disparos'].to_numpy() / capacidade))
+    alocacao['leads_esperados'] = (alcance * historico['leads'].to_numpy() / historico['disparos'].to_numpy()).round(1)
+    alocacao['receita_esperada'] = (alcance * receita_por_disparo.mean(axis=0)).round(2)
+    alocacao = alocacao.sort_values('orcamento', ascending=False).reset_index(drop=True)
+
+    resumo = {
+        'orcamento': orcamento,
+        'lucro_medio': float(melhor_lucro.mean()),
+        'lucro_p5': float(np.quantile(melhor_lucro, 0.05)),
+        'lucro_p95': float(np.quantile(melhor_lucro, 0.95)),
+        'roi_medio': float(melhor_lucro.mean() / orcamento * 100) if orcamento else 0.0,
+        'candidatos_avaliados': candidatos * rodadas,
+    }
+    return alocacao, resumo
@@ -0,0 +1,400 @@
+# Snapshots diários materializados a partir dos exports.
+# Um job agendado (ex.: cron no começo do dia) roda o tratamento completo (limpeza,
+# validação e duplicados) nos exports mais recentes e grava num diretório por data:
+# - os DataFrames tratados, as quarentenas e o índice de duplicados, para o painel
+#   abrir sem ler CSV nem rodar a limpeza;
+# - agregados dos dias já fechados, por dia, pelas dimensões dos filtros e pela marca de
+#   duplicado: cubo, matrizes de cohort, funil, perdas por etapa e gasto por canal.
+# No painel o snapshot é a base, e só o export enviado no dia (o delta) é tratado ao vivo.
+# Quando nada exige as linhas (sem delta, sem drill-down, etapa Lead e período só com
+# dias fechados), KPIs, funil, perdas e cohort saem direto dos agregados (PainelAgregado).
+#
+#   python snapshot.py --exportacoes /caminho/dos/exports
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+from datetime import date, datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import calendario
+import dados_compartilhados
+import deduplicacao
+import graficos
+import limpeza
+import validacao
+from perfil import medir
+
+DIRETORIO_PADRAO = os.environ.get('CAMPANHAS_SNAPSHOTS', 'snapshots')
+MANIFESTO = 'manifesto.json'
+MANTER_PADRAO = 7
+
+# Formato dos agregados; snapshots de outra versão só servem a base de linhas
+VERSAO_AGREGADOS = 2
+
+# Dimensões dos filtros do painel, usadas como chave dos agregados
+DIMENSOES = ['equipe', 'produto', 'convenio_acronimo', 'origem']
+# Colunas do gasto -> filtro do painel correspondente
+DIMENSOES_GASTO = {'Convênio': 'convenio_acronimo', 'Produto': 'produto', 'Equipe': 'equipe', 'Canal': 'origem'}
+
+# Eventos das matrizes de cohort -> coluna de data
+EVENTOS_COHORT = {
+    'Pagamento': 'data_pago',
+    'Perda': 'data_perda',
+    'Negociação': 'data_negociacao',
+    'Contratação': 'data_contratacao',
+}
+SEM_EVENTO = 'sem evento'
+# Evento registrado antes da entrada do lead: conta na cohort, mas fica fora das faixas
+ANTES_DA_ENTRADA = 'antes da entrada'
+
+
+# Limpeza e validação de cada export, as mesmas usadas no painel: DataFrame válido e quarentena
+def tratar_hubspot(bruto):
+    return validacao.validar_e_separar_hubspot(limpeza.tratar_arquivo_hubspot(bruto), bruto)
+
+
+def tratar_gasto(bruto):
+    return validacao.validar_e_separar_gasto(limpeza.tratar_arquivo_pagos(bruto))
+
+
+def _somar(tabela, chaves, valores):
+    return tabela.groupby(chaves, dropna=False, observed=True, as_index=False)[valores].sum()
+
+
+# Chaves comuns dos agregados do HubSpot: dia de entrada, dimensões e marca de duplicado
+CHAVES = ['dia_num', *DIMENSOES, 'duplicado']
+
+
+def _base(df, colunas=()):
+    duplicado = df['duplicado'].to_numpy() if 'duplicado' in df else np.zeros(len(df), dtype=bool)
+    return df[['dia_num', *DIMENSOES, *colunas]].assign(duplicado=duplicado)
+
+
+def _cubo(df, df_gasto):
+    tabela = _base(df, ['etapa']).assign(leads=1, comissao_paga=df['comissao_paga'].fillna(0).to_numpy())
+    return _somar(tabela, [*CHAVES, 'etapa'], ['leads', 'comissao_paga'])
+
+
+# Leads por dia de entrada e faixa de dias até cada evento (tabela longa, só células com leads)
+def _cohorts(df, df_gasto):
+    rotulos = np.array(list(graficos.FAIXAS_ATRASO) + [ANTES_DA_ENTRADA, SEM_EVENTO], dtype=object)
+    partes = []
+    for evento, coluna in EVENTOS_COHORT.items():
+        _, faixa = graficos.calcular_cohort(df, coluna)
+        # Faixa -1: evento antes da entrada (penúltima posição) ou sem evento (última)
+        com_evento = calendario.numero_dia(df[coluna])[df['dia_num'].to_numpy() != calendario.DIA_INVALIDO]
+        faixa = np.where(faixa >= 0, faixa, np.where(com_evento != calendario.DIA_INVALIDO, -2, -1))
+        tabela = _base(df).assign(faixa=rotulos[faixa], quantidade=1)
+        partes.append(_somar(tabela, [*CHAVES, 'faixa'], ['quantidade']).assign(evento=evento))
+    return pd.concat(partes, ignore_index=True)
+
+
+# Leads que chegaram a cada etapa, pelo dia de entrada
+def _funil(df, df_gasto):
+    etapas = {etapa: df[coluna].notna().to_numpy() for etapa, coluna in limpeza.COLUNAS_ETAPA.items()}
+    return _somar(_base(df).assign(**etapas), CHAVES, list(etapas))
+
+
+def _perdas_etapa(df, df_gasto):
+    perdidos, etapa_origem = graficos.etapa_origem_perdas(df)
+    tabela = _base(df.iloc[np.flatnonzero(perdidos)], ['motivo_perda_grupo'])
+    tabela = tabela.assign(etapa_origem=etapa_origem, quantidade=1)
+    return _somar(tabela, [*CHAVES, 'etapa_origem', 'motivo_perda_grupo'], ['quantidade'])
+
+
+def _gasto_canal(df, df_gasto):
+    dimensoes = [c for c in DIMENSOES_GASTO if c in df_gasto]
+    return _somar(df_gasto, ['dia_num', *dimensoes], ['Quantidade', 'Valor Gasto'])
+
+
+# Agregados gravados no snapshot: nome do arquivo -> função que recebe (df, df_gasto)
+AGREGADOS = {
+    'cubo': _cubo,
+    'cohorts': _cohorts,
+    'funil': _funil,
+    'perdas_etapa': _perdas_etapa,
+    'gasto_canal': _gasto_canal,
+}
+
+
+def _dia(data):
+    return int(calendario.numero_dia([data])[0])
+
+
+def _fechados(df, corte):
+    dias = df['dia_num'].to_numpy()
+    return df.iloc[np.flatnonzero((dias != calendario.DIA_INVALIDO) & (dias < _dia(corte)))]
+
+
+# Agregados dos dias anteriores ao corte (os dias já fechados)
+@medir()
+def agregar(df, df_gasto, corte):
+    fechados, gasto_fechado = _fechados(df, corte), _fechados(df_gasto, corte)
+    return {nome: funcao(fechados, gasto_fechado) for nome, funcao in AGREGADOS.items()}
+
+
+# Export mais recente (pela data de modificação) cujo nome indica o tipo, como no upload do painel
+def export_mais_recente(pasta, tipo):
+    candidatos = [
+        os.path.join(pasta, nome) for nome in os.listdir(pasta)
+        if nome.lower().endswith('.csv') and tipo in nome.lower()
+    ]
+    return max(candidatos, key=os.path.getmtime) if candidatos else None
+
+
+def _ler(caminho):
+    with open(caminho, 'rb') as arquivo:
+        conteudo = arquivo.read()
+    return pd.read_csv(io.BytesIO(conteudo)), conteudo
+
+
+def _limpar_antigos(diretorio, manter):
+    snapshots = _snapshots(diretorio)
+    # Fatia pelo início: com manter=0, [:-0] seria vazia e nada seria apagado
+    for caminho in snapshots[:max(len(snapshots) - manter, 0)]:
+        shutil.rmtree(caminho, ignore_errors=True)
+
+
+# Totais do export inteiro (base da taxa de conversão geral dos KPIs)
+def _totais(df):
+    pago = (df['etapa'] == 'PAGO').to_numpy()
+    unico = ~df['duplicado'].to_numpy() if 'duplicado' in df else np.ones(len(df), dtype=bool)
+    return {
+        'leads': len(df), 'pagos': int(pago.sum()),
+        'leads_unicos': int(unico.sum()), 'pagos_unicos': int((pago & unico).sum()),
+    }
+
+
+@medir()
+def gerar_snapshot(caminho_hubspot, caminho_gasto, diretorio=DIRETORIO_PADRAO, corte=None, manter=MANTER_PADRAO):
+    corte = corte or date.today()
+    bruto, conteudo_hubspot = _ler(caminho_hubspot)
+    bruto_gasto, conteudo_gasto = _ler(caminho_gasto)
+
+    # Índice de duplicados explícito: parte do histórico persistido (se configurado), não
+    # do estado do servidor, e recebe os primeiros contatos do export
+    indice = deduplicacao.IndiceDuplicados.carregar(deduplicacao.CAMINHO_INDICE)
+    hubspot, quarentena_hubspot = tratar_hubspot(bruto)
+    gasto, quarentena_gasto = tratar_gasto(bruto_gasto)
+    dados = {'hubspot': deduplicacao.marcar_duplicados(hubspot, indice, incorporar=True), 'gasto': gasto}
+    quarentenas = {'hubspot': quarentena_hubspot, 'gasto': quarentena_gasto}
+
+    destino = os.path.join(diretorio, corte.isoformat())
+    temporario = destino + '.tmp'
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+    for tipo, df in dados.items():
+        df.to_pickle(os.path.join(temporario, f'{tipo}.pkl'))
+        pd.to_pickle(quarentenas[tipo], os.path.join(temporario, f'quarentena_{tipo}.pkl'))
+    indice.tabela.to_pickle(os.path.join(temporario, 'indice_duplicados.pkl'))
+    for nome, tabela in agregar(dados['hubspot'], dados['gasto'], corte).items():
+        tabela.to_pickle(os.path.join(temporario, f'{nome}.pkl'))
+
+    manifesto = {
+        'corte': corte.isoformat(),
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'arquivos': {
+            'hubspot': {'nome': os.path.basename(caminho_hubspot), 'hash': dados_compartilhados.hash_conteudo(conteudo_hubspot, 'hubspot')},
+            'gasto': {'nome': os.path.basename(caminho_gasto), 'hash': dados_compartilhados.hash_conteudo(conteudo_gasto, 'gasto')},
+        },
+        'linhas': {tipo: len(df) for tipo, df in dados.items()},
+        'totais': _totais(dados['hubspot']),
+        'agregados': list(AGREGADOS),
+        'versao_agregados': VERSAO_AGREGADOS,
+    }
+    with open(os.path.join(temporario, MANIFESTO), 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2, ensure_ascii=False)
+
+    # O manifesto só aparece no destino junto com os demais arquivos
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporario, destino)
+    if deduplicacao.CAMINHO_INDICE:
+        indice.salvar(deduplicacao.CAMINHO_INDICE)
+    _limpar_antigos(diretorio, manter)
+    return destino
+
+
+# Diretórios de snapshot completos (nome AAAA-MM-DD com manifesto), do mais antigo ao mais novo
+def _snapshots(diretorio):
+    if not os.path.isdir(diretorio):
+        return []
+    caminhos = []
+    for nome in sorted(os.listdir(diretorio)):
+        try:
+            date.fromisoformat(nome)
+        except ValueError:
+            continue
+        if os.path.exists(os.path.join(diretorio, nome, MANIFESTO)):
+            caminhos.append(os.path.join(diretorio, nome))
+    return caminhos
+
+
+def ultimo(diretorio=DIRETORIO_PADRAO):
+    snapshots = _snapshots(diretorio)
+    return snapshots[-1] if snapshots else None
+
+
+def ler_manifesto(caminho):
+    with open(os.path.join(caminho, MANIFESTO), encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+# DataFrame tratado do snapshot e a quarentena gravada com ele
+@medir()
+def carregar(caminho, tipo):
+    dados = pd.read_pickle(os.path.join(caminho, f'{tipo}.pkl'))
+    return dados, pd.read_pickle(os.path.join(caminho, f'quarentena_{tipo}.pkl'))
+
+
+# Índice de duplicados gravado com o snapshot: o delta é marcado contra ele, e não contra
+# o índice global, para as marcas dependerem só do snapshot e do arquivo enviado
+@lru_cache(maxsize=2)
+def carregar_indice(caminho, gerado_em):
+    return deduplicacao.IndiceDuplicados.carregar(os.path.join(caminho, 'indice_duplicados.pkl'))
+
+
+# Recorte de um agregado pelos filtros do painel: dimensões, período e, como no filtro
+# de linhas, dias úteis (com os feriados locais do convênio) e leads únicos
+def recortar(tabela, filtros, data_inicio, data_fim, considerar_dias_uteis=False, somente_unicos=False):
+    dias = tabela['dia_num'].to_numpy()
+    mascara = (dias >= _dia(data_inicio)) & (dias <= _dia(data_fim))
+    for coluna in tabela.columns:
+        filtro = DIMENSOES_GASTO.get(coluna, coluna)
+        if filtro in filtros:
+            mascara &= tabela[coluna].isin(filtros[filtro]).to_numpy()
+    if considerar_dias_uteis:
+        coluna_convenio = 'convenio_acronimo' if 'convenio_acronimo' in tabela else 'Convênio'
+        mascara &= calendario.obter_calendario(data_inicio, data_fim).mascara(dias, tabela[coluna_convenio].to_numpy())
+    if somente_unicos and 'duplicado' in tabela:
+        mascara &= ~tabela['duplicado'].to_numpy()
+    return tabela.iloc[np.flatnonzero(mascara)]
+
+
+# Soma o recorte no período, mantendo as colunas de texto como chave
+def resumir(recorte):
+    colunas = [c for c in recorte.columns if c not in ('dia_num', 'duplicado')]
+    valores = [c for c in colunas if pd.api.types.is_numeric_dtype(recorte[c])]
+    return _somar(recorte, [c for c in colunas if c not in valores], valores)
+
+
+# O gerado_em faz parte da chave: um snapshot refeito no mesmo dia não reaproveita o anterior
+@lru_cache(maxsize=8)
+def carregar_agregado(caminho, nome, gerado_em):
+    return pd.read_pickle(os.path.join(caminho, f'{nome}.pkl'))
+
+
+# Os agregados respondem pelo painel quando nada exige as linhas: sem export do dia por
+# cima do snapshot (ele troca negócios antigos), sem drill-down, etapa Lead (a chave dos
+# agregados é o dia de entrada) e período só com dias fechados
+def atende(manifesto, etapa, data_fim, com_delta, com_drill):
+    return (
+        manifesto.get('versao_agregados') == VERSAO_AGREGADOS and not com_delta and not com_drill
+        and etapa == 'Lead' and data_fim < date.fromisoformat(manifesto['corte'])
+    )
+
+
+# KPIs, funil, perdas e cohort a partir dos agregados, com o mesmo recorte do filtro de linhas
+class PainelAgregado:
+    def __init__(self, caminho, manifesto, filtros, data_inicio, data_fim, considerar_dias_uteis, somente_unicos):
+        self.caminho = caminho
+        self.manifesto = manifesto
+        self.filtros = filtros
+        self.periodo = (data_inicio, data_fim)
+        self.considerar_dias_uteis = considerar_dias_uteis
+        self.somente_unicos = somente_unicos
+        self._recortes = {}
+
+    def recorte(self, nome):
+        if nome not in self._recortes:
+            tabela = carregar_agregado(self.caminho, nome, self.manifesto['gerado_em'])
+            self._recortes[nome] = recortar(
+                tabela, self.filtros, *self.periodo, self.considerar_dias_uteis, self.somente_unicos
+            )
+        return self._recortes[nome]
+
+    @medir()
+    def kpis(self):
+        cubo = self.recorte('cubo')
+        pago = (cubo['etapa'] == 'PAGO').to_numpy()
+        sufixo = '_unicos' if self.somente_unicos else ''
+        totais = self.manifesto['totais']
+        gastos = limpeza.calcular_gastos(self.recorte('gasto_canal'))
+        return graficos.montar_kpis(
+            totais['leads' + sufixo], totais['pagos' + sufixo], cubo['leads'].sum(), cubo['leads'].to_numpy()[pago].sum(),
+            cubo['comissao_paga'].to_numpy()[pago].sum(), gastos['valor_pago'].sum(),
+            *self.periodo, self.considerar_dias_uteis, self.filtros['convenio_acronimo']
+        )
+
+    # Leads que chegaram a cada etapa, com os nomes do gráfico de funil
+    def funil(self):
+        funil = self.recorte('funil')
+        return {etapa.upper(): funil[etapa].sum() for etapa in limpeza.COLUNAS_ETAPA}
+
+    def perdas_etapa(self):
+        perdas = self.recorte('perdas_etapa').groupby('etapa_origem')['quantidade'].sum()
+        return perdas.sort_values(ascending=False, kind='stable').reset_index()
+
+    # Mesmo formato de graficos.tabela_perdas_por_motivo
+    def perdas_motivo(self):
+        perdas = self.recorte('perdas_etapa').rename(columns={'motivo_perda_grupo': 'motivo'})
+        # Motivos como valores soltos (não categoria), na mesma ordem da tabela por linhas
+        perdas['motivo'] = perdas['motivo'].astype(object)
+        return _somar(perdas, ['motivo', 'etapa_origem', 'origem'], ['quantidade'])
+
+    # Dias de entrada, faixas (-1 fora das faixas) e quantidades de um evento da cohort
+    def cohort(self, evento):
+        cohorts = self.recorte('cohorts')
+        cohorts = cohorts.iloc[np.flatnonzero((cohorts['evento'] == evento).to_numpy())]
+        codigos = {rotulo: i for i, rotulo in enumerate(graficos.FAIXAS_ATRASO)}
+        faixa = cohorts['faixa'].map(codigos).fillna(-1).to_numpy(dtype='int64')
+        return cohorts['dia_num'].to_numpy(), faixa, cohorts['quantidade'].to_numpy()
+
+
+# Negócios do export do dia substituem os do snapshot com o mesmo id (mudanças de etapa
+# de leads antigos entram pelo delta)
+@medir()
+def combinar_hubspot(base, delta):
+    mantidos = base.iloc[np.flatnonzero(~base['id'].isin(delta['id']).to_numpy())]
+    return pd.concat([mantidos, delta], ignore_index=True)
+
+
+# O gasto não tem id: dias anteriores ao corte vêm do snapshot, os demais do export do dia
+@medir()
+def combinar_gasto(base, delta, corte):
+    return pd.concat([
+        base.iloc[np.flatnonzero(base['dia_num'].to_numpy() < _dia(corte))],
+        delta.iloc[np.flatnonzero(delta['dia_num'].to_numpy() >= _dia(corte))],
+    ], ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera o snapshot diário do painel de campanhas.')
+    parser.add_argument('--exportacoes', default='.', help='Pasta com os exports (usa o CSV mais recente de cada tipo)')
+    parser.add_argument('--hubspot', help='Export do HubSpot (substitui a busca na pasta)')
+    parser.add_argument('--gasto', help='Export de gasto (substitui a busca na pasta)')
+    parser.add_argument('--destino', default=DIRETORIO_PADRAO)
+    parser.add_argument('--corte', type=date.fromisoformat, help='Primeiro dia não fechado (padrão: hoje)')
+    parser.add_argument('--manter', type=int, default=MANTER_PADRAO, help='Quantidade de snapshots mantidos')
+    args = parser.parse_args(argv)
+    if args.manter < 1:
+        parser.error('--manter precisa ser pelo menos 1 (o snapshot recém-gerado)')
+
+    caminho_hubspot = args.hubspot or export_mais_recente(args.exportacoes, 'hubspot')
+    caminho_gasto = args.gasto or export_mais_recente(args.exportacoes, 'gasto')
+    if not caminho_hubspot or not caminho_gasto:
+        print(f'Exports do HubSpot e de gasto não encontrados em {args.exportacoes}.')
+        return 1
+
+    destino = gerar_snapshot(caminho_hubspot, caminho_gasto, args.destino, args.corte, args.manter)
+    print(destino)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
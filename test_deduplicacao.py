@@ -0,0 +1,43 @@
+import pandas as pd
+
+import deduplicacao
+
+
+def _leads(linhas):
+    return pd.DataFrame(linhas, columns=['id', 'cpf', 'telefone', 'dia_num', 'origem'])
+
+
+# Negócio com CPF e negócio sem CPF que dividem o telefone (com e sem DDI)
+def test_telefone_liga_negocio_com_cpf_a_negocio_sem_cpf():
+    df = _leads([
+        ('A', '529.982.247-25', '11999990000', 10, 'SMS'),
+        ('B', None, '5511999990000', 12, 'RCS'),
+    ])
+    duplicado, id_primeiro, origem_primeiro, _ = deduplicacao.IndiceDuplicados().marcar(df)
+    assert duplicado.tolist() == [False, True]
+    assert id_primeiro.tolist() == ['A', 'A']
+    assert origem_primeiro.tolist() == ['SMS', 'SMS']
+
+
+# CPFs diferentes com o mesmo telefone também são ligados pelo telefone
+def test_telefone_liga_cpfs_diferentes():
+    df = _leads([
+        ('A', '529.982.247-25', '11999990000', 10, 'SMS'),
+        ('B', '111.444.777-35', '11999990000', 11, 'RCS'),
+    ])
+    duplicado, id_primeiro, _, _ = deduplicacao.IndiceDuplicados().marcar(df)
+    assert duplicado.tolist() == [False, True]
+    assert id_primeiro.tolist() == ['A', 'A']
+
+
+# O primeiro contato pode vir do índice, por qualquer uma das chaves
+def test_primeiro_contato_no_indice_pelo_telefone():
+    indice = deduplicacao.IndiceDuplicados()
+    _, _, _, lote = indice.marcar(_leads([('A', None, '11999990000', 1, 'SMS')]))
+    indice.incorporar(lote)
+
+    df = _leads([('B', '529.982.247-25', '(11) 99999-0000', 5, 'RCS')])
+    duplicado, id_primeiro, _, _ = indice.marcar(df)
+    assert duplicado.tolist() == [True]
+    assert id_primeiro.tolist() == ['A']
+    assert len(indice) == 1
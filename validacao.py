@@ -0,0 +1,95 @@
+# Validação vetorizada na ingestão, com quarentena das linhas com problema.
+# Cada regra é uma máscara booleana calculada sobre as colunas inteiras (ou sobre os
+# valores distintos, via pd.factorize); as linhas que falham em alguma regra saem do
+# DataFrame usado no painel e ficam numa tabela de quarentena com as regras violadas.
+# A quarentena (tabela e contagens por regra) é devolvida junto com o DataFrame válido.
+import numpy as np
+import pandas as pd
+
+import calendario
+from datas import TEXTOS_VAZIOS
+from limpeza import COLUNAS_DATA_ETAPA, COLUNAS_HUBSPOT, MAPEAMENTO_CONVENIOS, TARIFAS_CANAL
+from perfil import medir
+
+REGRAS = {
+    'data_invalida': 'Data ausente ou em formato inválido',
+    'data_etapa_invalida': 'Data de entrada em etapa em formato inválido',
+    'id_ausente': 'ID do registro ausente',
+    'convenio_sem_sigla': 'Convênio fora do mapeamento de siglas',
+    'canal_sem_tarifa': 'Canal sem tarifa de disparo',
+    'quantidade_negativa': 'Quantidade negativa',
+}
+
+
+# Testa cada valor distinto uma única vez e espalha o resultado pelas linhas
+def _por_valor(serie, teste):
+    codigos, unicos = pd.factorize(serie)
+    resultado = np.array([teste(u) for u in unicos] + [teste(None)], dtype=bool)
+    return resultado[codigos]
+
+
+# Datas de etapa preenchidas no export que a limpeza não conseguiu ler (bruto: export
+# antes da limpeza, com as mesmas linhas)
+def _etapas_nao_lidas(df, bruto):
+    originais = {novo: original for original, novo in COLUNAS_HUBSPOT.items()}
+    falhas = np.zeros(len(df), dtype=bool)
+    for coluna in COLUNAS_DATA_ETAPA:
+        texto = bruto[originais[coluna]]
+        candidatas = np.flatnonzero(texto.notna().to_numpy() & df[coluna].isna().to_numpy())
+        # Textos de data vazia ('NaT', ' ') não são falha de leitura
+        falhas[candidatas] |= _por_valor(texto.iloc[candidatas], lambda t: str(t).strip() not in TEXTOS_VAZIOS)
+    return falhas
+
+
+def validar_hubspot(df, bruto):
+    return {
+        'data_invalida': df['dia_num'].to_numpy() == calendario.DIA_INVALIDO,
+        'data_etapa_invalida': _etapas_nao_lidas(df, bruto),
+        'id_ausente': df['id'].isna().to_numpy(),
+        'convenio_sem_sigla': _por_valor(
+            df['convenio'], lambda c: not isinstance(c, str) or c.lower() not in MAPEAMENTO_CONVENIOS
+        ),
+    }
+
+
+def validar_gasto(df):
+    return {
+        'data_invalida': df['dia_num'].to_numpy() == calendario.DIA_INVALIDO,
+        'canal_sem_tarifa': _por_valor(df['Canal'], lambda c: c not in TARIFAS_CANAL),
+        'quantidade_negativa': (pd.to_numeric(df['Quantidade'], errors='coerce') < 0).to_numpy(),
+    }
+
+
+# Separa as linhas válidas; devolve o DataFrame válido e a quarentena (tabela e contagens por regra)
+def separar_quarentena(df, mascaras):
+    invalidas = np.logical_or.reduce(list(mascaras.values()))
+    contagens = {regra: int(mascara.sum()) for regra, mascara in mascaras.items()}
+
+    quarentena = df[invalidas].copy()
+    violadas = np.array([np.where(m[invalidas], regra + ';', '') for regra, m in mascaras.items()], dtype=object)
+    quarentena['regras'] = pd.Series(violadas.sum(axis=0), index=quarentena.index, dtype='object').str.rstrip(';')
+
+    validos = df[~invalidas].reset_index(drop=True) if invalidas.any() else df
+    return validos, (quarentena, contagens)
+
+
+# Quarentena única a partir das quarentenas das partes (ex.: snapshot e export do dia)
+def juntar_quarentenas(quarentenas):
+    quarentenas = [q for q in quarentenas if q is not None]
+    if not quarentenas:
+        return None
+    contagens = {}
+    for _, parcial in quarentenas:
+        for regra, n in parcial.items():
+            contagens[regra] = contagens.get(regra, 0) + n
+    return pd.concat([tabela for tabela, _ in quarentenas], ignore_index=True), contagens
+
+
+@medir()
+def validar_e_separar_hubspot(df, bruto):
+    return separar_quarentena(df, validar_hubspot(df, bruto))
+
+
+@medir()
+def validar_e_separar_gasto(df):
+    return separar_quarentena(df, validar_gasto(df))